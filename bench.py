@@ -0,0 +1,543 @@
+'''
+Benchmarks for the game engine.
+
+Run from the repository root:
+    python bench.py
+'''
+from typing import *
+
+import os
+import sys
+import time
+import random
+import asyncio
+import subprocess
+import tempfile
+
+from shulpek import engine
+from shulpek import events
+from shulpek import manager
+from shulpek import shard
+from shulpek import sim
+from shulpek import store
+from shulpek import stream
+
+
+def timeit(func: Callable, number: int) -> float:
+    '''
+    Returns the average time of a call in microseconds.
+    '''
+    start = time.perf_counter()
+    for _ in range(number):
+        func()
+
+    return (time.perf_counter() - start) / number * 1_000_000
+
+
+# game lookup
+
+def bench_lookup(sizes: List[int] = [10, 100, 1000, 10000], number: int = 100000):
+    '''
+    Measures `Manager.get_game_playing` with a growing amount of open games.
+    '''
+    print('get_game_playing:')
+
+    for size in sizes:
+        mg = manager.Manager()
+
+        # half of the games are started, half are pending invites
+        for i in range(size):
+            author = i * 2 + 1
+            game = mg.add_game(engine.Game(mg.emit, [(author, 'a'), (author + 1, 'b')], 0, 0))
+
+            if i % 2 == 0:
+                for j in game.players:
+                    mg.playing[j] = game
+                game.ready = True
+
+        last = size * 2
+        first = timeit(lambda: mg.get_game_playing(1), number)
+        opponent = timeit(lambda: mg.get_game_playing(last), number)
+        missing = timeit(lambda: mg.get_game_playing(-1), number)
+
+        print(f'  {size:>6} games: first {first:.3f}us, '
+            f'last {opponent:.3f}us, missing {missing:.3f}us')
+
+
+# deck
+
+def bench_deck(number: int = 20000):
+    '''
+    Measures round setup and drawing cards from the deck.
+    '''
+    print('deck:')
+    game = engine.Game(None, [(1, 'a'), (2, 'b')], 0, 0, seed=1)
+
+    def setup():
+        for i in game.players.values():
+            i.hand = 0
+        game.shuffle_deck()
+        game.redistribute_cards()
+
+    def draw():
+        game.shuffle_deck()
+        while len(game.deck) > 0:
+            game.add_card(1 + len(game.deck) % 2)
+
+    shuffle = timeit(game.shuffle_deck, number)
+    print(f'  round setup: {timeit(setup, number):.2f}us')
+    print(f'  draw: {(timeit(draw, number) - shuffle) / len(engine.DECK) * 1000:.0f}ns per card')
+
+
+# sharding
+
+def shard_worker(index: int, queue, acks, results):
+    '''
+    Plays a game for every update routed to the shard.
+    '''
+    results.put(('ready', index))
+
+    while True:
+        update = queue.get()
+        if update == None: break
+
+        sim.play(update['update_id'], [sim.random_policy] * 2)
+        results.put(('done', index))
+
+
+def bench_shards(counts: List[int] = [1, 2, 4, 8], updates: int = 2000, chats: int = 500):
+    '''
+    Measures throughput of routed updates with different amounts of workers.
+    '''
+    print('shards:')
+
+    for count in counts:
+        context = shard.multiprocessing.get_context('spawn')
+        results = context.Queue()
+        shards = shard.Shards(count, shard_worker, results)
+        shards.start()
+
+        for _ in range(count):
+            results.get()
+
+        start = time.perf_counter()
+        for i in range(updates):
+            shards.send({'update_id': i, 'message': {
+                'chat': {'id': -1000 - i % chats}, 'from': {'id': i}, 'text': 'x'
+            }})
+
+        for _ in range(updates):
+            results.get()
+
+        elapsed = time.perf_counter() - start
+        shards.stop()
+
+        print(f'  {count} workers: {updates / elapsed:.0f} updates/s')
+
+
+# self-play
+
+def bench_sim(games: int = 2000):
+    '''
+    Measures headless games per second in one process.
+    '''
+    print('self-play:')
+
+    for name in sim.POLICIES:
+        start = time.perf_counter()
+        sim.simulate(0, games, [name, name])
+        print(f'  {name}: {games / (time.perf_counter() - start):.0f} games/s')
+
+
+# status message
+
+def bench_render(games: int = 200, repeats: int = 5):
+    '''
+    Measures the status message after every move, rendered from
+    scratch and from the cache, and rendered again unchanged
+    like a coalesced or retried send does.
+    '''
+    from shulpek import render
+
+    print('status message:')
+
+    states = []
+    for i in range(games):
+        recorder = sim.Recorder()
+        game = engine.Game(recorder.emit, [(1, 'a'), (2, 'b')], 0, 0, i)
+        game.ready_up()
+        rng = random.Random(i)
+
+        moves = []
+        for _ in range(200):
+            if recorder.over or game.waiting: break
+            action = sim.greedy_policy(game, game.turn, rng)
+            moves.append((game.turn, action))
+            sim.apply(game, game.turn, action)
+
+        states.append((i, moves))
+
+    def run(get: Callable[[engine.Game], str]) -> Tuple[float, float, int]:
+        first = again = 0.0
+        count = 0
+
+        for seed, moves in states:
+            game = engine.Game(sim.Recorder().emit, [(1, 'a'), (2, 'b')], 0, 0, seed)
+            game.ready_up()
+
+            for id, action in moves:
+                sim.apply(game, id, action)
+
+                start = time.perf_counter()
+                get(game)
+                middle = time.perf_counter()
+                for _ in range(repeats):
+                    get(game)
+                end = time.perf_counter()
+
+                first += middle - start
+                again += (end - middle) / repeats
+                count += 1
+
+        return first / count * 1_000_000, again / count * 1_000_000, count
+
+    for name, get in [('built', render.build), ('cached', render.Renderer().get)]:
+        first, again, count = run(get)
+        print(f'  {name}: {first:.2f}us after a move, {again:.2f}us unchanged ({count} moves)')
+
+
+# inline answers
+
+def percentile(values: List[float], share: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+def bench_inline(games: int = 1000, queries: int = 20000, burst: int = 10):
+    '''
+    Measures inline answer latency for a burst of queries,
+    each user typing `burst` keystrokes in a row.
+    '''
+    from shulpek import answers
+
+    print('inline answers:')
+
+    players = []
+    for i in range(games):
+        game = engine.Game(sim.Recorder().emit, [(i * 2 + 1, 'a'), (i * 2 + 2, 'b')], 0, 0, i)
+        game.ready_up()
+        players.extend([(game, j) for j in game.players])
+
+    rng = random.Random(0)
+    stream = []
+    while len(stream) < queries:
+        stream.extend([rng.choice(players)] * burst)
+
+    cache = answers.Answers()
+    for name, get in [('built', answers.build), ('cached', cache.get)]:
+        times = []
+        for game, id in stream:
+            start = time.perf_counter()
+            get(game, id)
+            times.append((time.perf_counter() - start) * 1_000_000)
+
+        print(f'  {name}: p50 {percentile(times, 0.5):.1f}us, p99 {percentile(times, 0.99):.1f}us')
+
+    # answering takes a network round trip, keystrokes come faster
+    async def run() -> int:
+        coalescer = answers.Coalescer()
+        sent = 0
+
+        async def answer(id: int):
+            nonlocal sent
+            sent += 1
+            await asyncio.sleep(0.005)
+
+        async def user(id: int):
+            for _ in range(burst):
+                asyncio.create_task(coalescer.run(id, id, answer))
+                await asyncio.sleep(0.001)
+
+        await asyncio.gather(*[user(i) for i in range(100)])
+        await asyncio.sleep(0.1)
+        return sent
+
+    print(f'  coalesced: {asyncio.run(run())} answers sent for {100 * burst} queries')
+
+
+# event stream
+
+def bench_events(games: int = 200, moves: int = 200):
+    '''
+    Plays many games at once, publishing every event to three consumers,
+    and counts how many renders batching leaves.
+    '''
+    print('event stream:')
+
+    async def run() -> Tuple[Dict[str, int], float]:
+        published = stream.EventStream()
+        counts = {'events': 0, 'batches': 0, 'renders': 0}
+
+        def render(batch: List[events.Event]):
+            counts['events'] += len(batch)
+            counts['batches'] += 1
+            counts['renders'] += len(set([i.game.id for i in batch]))
+
+        consumers = [asyncio.create_task(stream.consume(published.subscribe(), render))]
+        for _ in range(2):
+            consumers.append(asyncio.create_task(stream.consume(published.subscribe(), lambda batch: None)))
+
+        # every player moves as soon as an update arrives
+        async def player(i: int):
+            rng = random.Random(i)
+            game = engine.Game(published.publish, [(i * 2 + 1, 'a'), (i * 2 + 2, 'b')], 0, 0, i)
+            game.ready_up()
+
+            for _ in range(moves):
+                if game.over: break
+
+                if game.waiting:
+                    game.new_round()
+                else:
+                    sim.apply(game, game.turn, sim.random_policy(game, game.turn, rng))
+
+                await asyncio.sleep(0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*[player(i) for i in range(games)])
+        while any([not i.empty() for i in published.queues]):
+            await asyncio.sleep(0)
+        elapsed = time.perf_counter() - start
+
+        for i in consumers:
+            i.cancel()
+
+        return counts, elapsed
+
+    counts, elapsed = asyncio.run(run())
+    print(f'  {counts["events"]} events in {elapsed:.2f}s ({counts["events"] / elapsed:.0f} events/s)')
+    print(f'  {counts["batches"]} batches, {counts["renders"]} renders '
+        f'({counts["renders"] / counts["events"] * 100:.0f}% of events)')
+
+
+# game stores
+
+def bench_store(games: int = 200, moves: int = 100):
+    '''
+    Plays games through `Manager.apply` in one process, and on two
+    instances sharing a fake Redis, where every move goes to either
+    instance and other instances' changes have to be loaded.
+    '''
+    print('game store:')
+
+    async def run(managers: List[manager.Manager]) -> Tuple[int, float]:
+        for i in managers:
+            await i.start()
+
+        async def player(i: int) -> int:
+            rng = random.Random(i)
+            author = i * 2 + 1
+
+            game = await managers[0].new_game([(author, 'a'), (author + 1, 'b')], 0, 0)
+            await managers[0].ready_up(game)
+
+            made = 0
+            for _ in range(moves):
+                mg = rng.choice(managers)
+                game = await mg.fetch(author)
+                if game == None or game.over: break
+
+                if game.waiting:
+                    await mg.apply(game, engine.Game.new_round)
+                else:
+                    turn = game.turn
+                    action = sim.random_policy(game, turn, rng)
+                    await mg.apply(game, lambda game: sim.apply(game, turn, action))
+
+                made += 1
+                await asyncio.sleep(0)
+
+            return made
+
+        start = time.perf_counter()
+        made = sum(await asyncio.gather(*[player(i) for i in range(games)]))
+        elapsed = time.perf_counter() - start
+
+        for i in managers:
+            await i.store.close()
+
+        return made, elapsed
+
+    server = store.FakeServer()
+    setups = [
+        ('memory', lambda: [manager.Manager()]),
+        ('fake redis, 1 instance', lambda: [manager.Manager(store.RedisStore(store.FakeRedis()))]),
+        ('fake redis, 2 instances', lambda: [manager.Manager(store.RedisStore(store.FakeRedis(server))) for _ in range(2)])
+    ]
+
+    for name, managers in setups:
+        made, elapsed = asyncio.run(run(managers()))
+        print(f'  {name}: {made / elapsed:.0f} moves/s')
+
+
+# bot api session
+
+def bench_session(calls: int = 2000, degraded: int = 200, port: int = 8082):
+    '''
+    Compares aiogram's default session with the tuned one
+    against the load test's fake Bot API.
+    '''
+    from aiogram import Bot
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+
+    import loadtest
+    from shulpek import session
+
+    print('bot api session:')
+
+    async def run():
+        api = loadtest.FakeAPI()
+        runner = await api.serve(port)
+        server = TelegramAPIServer.from_base(f'http://127.0.0.1:{port}')
+
+        for name, client in [('default', AiohttpSession(api=server)), ('tuned', session.Session(api=server))]:
+            bot = Bot(loadtest.TOKEN, session=client)
+
+            # healthy, every call takes 10ms
+            api.delay = 0.01
+            start = time.perf_counter()
+            await asyncio.gather(*[bot.send_message(-1, 'x') for _ in range(calls)])
+            healthy = calls / (time.perf_counter() - start)
+
+            # failing slowly, calls keep coming
+            api.delay = 0.5
+            api.failing = True
+            start = time.perf_counter()
+            times = []
+
+            async def call():
+                begin = time.perf_counter()
+                try:
+                    await bot.send_message(-1, 'x')
+                except Exception:
+                    pass
+                times.append(time.perf_counter() - begin)
+
+            for _ in range(degraded):
+                asyncio.create_task(call())
+                await asyncio.sleep(0.005)
+            while len(times) < degraded:
+                await asyncio.sleep(0.01)
+
+            api.delay = 0.0
+            api.failing = False
+
+            print(f'  {name}: {healthy:.0f} calls/s healthy, '
+                f'failing calls p50 {percentile(times, 0.5) * 1000:.0f}ms, '
+                f'{api.calls.get("sendmessage", 0) - calls} reached the API')
+            api.calls = {}
+
+            await client.close()
+
+        # a button answer the handler doesn't need to wait for
+        bot = Bot(loadtest.TOKEN, session=session.Session(api=server))
+        api.delay = 0.05
+        tasks = set()
+
+        start = time.perf_counter()
+        await bot.answer_callback_query('1')
+        awaited = time.perf_counter() - start
+
+        start = time.perf_counter()
+        session.detach(bot.answer_callback_query('1'), tasks)
+        detached = time.perf_counter() - start
+
+        await asyncio.gather(*tasks)
+        print(f'  callback answer: awaited {awaited * 1000:.1f}ms, detached {detached * 1000:.3f}ms')
+
+        await bot.session.close()
+        await runner.cleanup()
+
+    asyncio.run(run())
+
+
+# cold start
+
+def bench_startup(runs: int = 5, port: int = 8083):
+    '''
+    Measures how long a fresh interpreter takes to import the engine
+    and the bot, and to boot the bot until it polls the fake Bot API.
+    '''
+    import loadtest
+
+    print('cold start:')
+
+    directory = tempfile.mkdtemp(prefix='shulpek-bench-')
+    env = dict(os.environ,
+        TOKEN=loadtest.TOKEN,
+        API_URL=f'http://127.0.0.1:{port}',
+        MODE='polling',
+        DB_PATH=os.path.join(directory, 'shulpek.db'),
+        EVENT_LOG=os.path.join(directory, 'logs'),
+        METRICS_PORT='',
+        AI_WORKERS='1'
+    )
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    def median(values: List[float]) -> float:
+        return sorted(values)[len(values) // 2]
+
+    def spawn(*args: str) -> subprocess.Popen:
+        return subprocess.Popen(
+            [sys.executable, *args], env=env, cwd=root,
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+
+    def imported(code: str) -> float:
+        times = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            spawn('-c', code).wait()
+            times.append(time.perf_counter() - start)
+
+        return median(times)
+
+    bare = imported('pass')
+    print(f'  interpreter: {bare * 1000:.0f}ms')
+
+    for name in ['shulpek.engine', 'shulpek.sim', 'shulpek.manager', 'shulpek.main']:
+        print(f'  import {name}: +{(imported(f"import {name}") - bare) * 1000:.0f}ms')
+
+    async def boot() -> float:
+        api = loadtest.FakeAPI()
+        runner = await api.serve(port)
+        times = []
+
+        for _ in range(runs):
+            api.polled.clear()
+            start = time.perf_counter()
+            process = spawn('-m', 'shulpek')
+            await api.polled.wait()
+            times.append(time.perf_counter() - start)
+
+            process.terminate()
+            await asyncio.get_running_loop().run_in_executor(None, process.wait)
+
+        await runner.cleanup()
+        return median(times)
+
+    print(f'  python -m shulpek until the first poll: {asyncio.run(boot()) * 1000:.0f}ms')
+
+
+if __name__ == '__main__':
+    bench_lookup()
+    bench_deck()
+    bench_events()
+    bench_render()
+    bench_inline()
+    bench_store()
+    bench_sim()
+    bench_session()
+    bench_shards()
+    bench_startup()
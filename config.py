@@ -1,8 +0,0 @@
-VALUES = ['A', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
-TYPES = ['♣', '♦', '♥', '♠']
-NAMES = {
-    "♣": "крести",
-    "♦": "бубны",
-    "♥": "черви",
-    "♠": "пики"
-}
\ No newline at end of file
@@ -0,0 +1,391 @@
+'''
+Load test: runs the bot against a local fake Bot API and
+simulates players until the bot saturates.
+
+    python loadtest.py --levels 10 50 100 250 500 1000 --duration 15
+
+The bot and the simulated players share the machine, so the
+numbers are only comparable between runs on the same hardware.
+'''
+from typing import *
+
+import argparse
+import asyncio
+import itertools
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+from aiohttp import web
+
+
+TOKEN = '123456:loadtest'
+BOT_ID = 123456
+
+# title of the answer when the game is over
+NOT_PLAYING = 'ты сейчас не играешь!'
+
+
+def user(id: int) -> dict:
+    return {'id': id, 'is_bot': False, 'first_name': f'player {id}'}
+
+
+def chat(id: int) -> dict:
+    return {'id': id, 'type': 'supergroup', 'title': 'load test'}
+
+
+class FakeAPI:
+    def __init__(self):
+        '''
+        Stands in for the Bot API. Updates put into `push` are given
+        to the bot through getUpdates, the bot's answers are matched
+        to the updates that caused them.
+        '''
+        self.updates: List[dict] = []
+        self.update_id = itertools.count(1)
+        self.message_id = itertools.count(1)
+        self.arrived: asyncio.Event = asyncio.Event()
+        self.polled: asyncio.Event = asyncio.Event()
+
+        # inline query id -> (sent at, future with the results)
+        self.inline: Dict[str, Tuple[float, asyncio.Future]] = {}
+        # chat -> futures waiting for the next message sent there
+        self.messages: Dict[int, List[asyncio.Future]] = {}
+
+        self.calls: Dict[str, int] = {}
+
+        # a degraded API answers slowly or with errors
+        self.delay: float = 0.0
+        self.failing: bool = False
+        # amount of next calls answered with a flood wait of `retry_after` seconds
+        self.flooded: int = 0
+        self.retry_after: int = 1
+
+        # (time, data) of every sent message, only kept when set
+        self.sent: Optional[List[Tuple[float, dict]]] = None
+
+
+    def push(self, update: dict):
+        update['update_id'] = next(self.update_id)
+        self.updates.append(update)
+        self.arrived.set()
+
+
+    def wait_message(self, chat: int) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.messages.setdefault(chat, []).append(future)
+
+        return future
+
+
+    def ask(self, id: str) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        self.inline[id] = (time.perf_counter(), future)
+
+        return future
+
+
+    async def get_updates(self, data: dict) -> list:
+        self.polled.set()
+        offset = int(data.get('offset', 0))
+        self.updates = [i for i in self.updates if i['update_id'] >= offset]
+
+        if len(self.updates) == 0:
+            self.arrived.clear()
+            try:
+                await asyncio.wait_for(self.arrived.wait(), float(data.get('timeout', 0)))
+            except asyncio.TimeoutError:
+                pass
+
+        return self.updates[:100]
+
+
+    def send_message(self, data: dict) -> dict:
+        id = int(data['chat_id'])
+
+        if self.sent != None:
+            self.sent.append((time.perf_counter(), data))
+
+        for i in self.messages.pop(id, []):
+            if not i.done(): i.set_result(data)
+
+        return {
+            'message_id': next(self.message_id),
+            'date': int(time.time()),
+            'chat': chat(id),
+            'from': {'id': BOT_ID, 'is_bot': True, 'first_name': 'shulpek', 'username': 'shulpek_bot'},
+            'text': data.get('text', '')
+        }
+
+
+    def answer_inline_query(self, data: dict) -> bool:
+        sent, future = self.inline.pop(data['inline_query_id'], (None, None))
+        if future != None and not future.done():
+            future.set_result((time.perf_counter() - sent, json.loads(data['results'])))
+
+        return True
+
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info['method'].lower()
+        data = dict(await request.post())
+        self.calls[method] = self.calls.get(method, 0) + 1
+
+        if self.delay > 0 and method != 'getupdates':
+            await asyncio.sleep(self.delay)
+
+        if self.failing:
+            return web.json_response(
+                {'ok': False, 'error_code': 500, 'description': 'Internal Server Error'}, status=500
+            )
+
+        if self.flooded > 0 and method != 'getupdates':
+            self.flooded -= 1
+            return web.json_response({
+                'ok': False, 'error_code': 429,
+                'description': f'Too Many Requests: retry after {self.retry_after}',
+                'parameters': {'retry_after': self.retry_after}
+            }, status=429)
+
+        if method == 'getme':
+            result = {'id': BOT_ID, 'is_bot': True, 'first_name': 'shulpek', 'username': 'shulpek_bot'}
+        elif method == 'getupdates':
+            result = await self.get_updates(data)
+        elif method == 'sendmessage':
+            result = self.send_message(data)
+        elif method == 'answerinlinequery':
+            result = self.answer_inline_query(data)
+        else:
+            result = True
+
+        return web.json_response({'ok': True, 'result': result})
+
+
+    async def serve(self, port: int) -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post('/bot{token}/{method}', self.handle)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+        await web.TCPSite(runner, '127.0.0.1', port).start()
+
+        return runner
+
+
+class Results:
+    def __init__(self):
+        '''
+        Inline answer latencies and action counts of the current level.
+        '''
+        self.latencies: List[float] = []
+        self.actions: int = 0
+        self.games: int = 0
+        self.timeouts: int = 0
+
+
+class Pair:
+    def __init__(self, api: FakeAPI, index: int, think: float, timeout: float):
+        '''
+        Two players in their own chat, playing game after game.
+        '''
+        self.api: FakeAPI = api
+        self.players: List[int] = [1_000_000 + index * 2, 1_000_001 + index * 2]
+        self.chat: int = -1_000_000 - index
+        self.think: float = think
+        self.timeout: float = timeout
+        self.rng: random.Random = random.Random(index)
+        self.queries = itertools.count()
+
+
+    def message(self, id: int, text: str, reply_to: int = None) -> dict:
+        data = {
+            'message_id': next(self.api.message_id),
+            'date': int(time.time()),
+            'chat': chat(self.chat),
+            'from': user(id),
+            'text': text
+        }
+        if text.startswith('/'):
+            data['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text)}]
+        if reply_to != None:
+            data['reply_to_message'] = self.message(reply_to, 'го')
+
+        return data
+
+
+    async def query(self, id: int, results: Results) -> Optional[List[dict]]:
+        '''
+        Sends an inline query and returns the answer.
+        '''
+        query = f'{id}:{next(self.queries)}'
+        future = self.api.ask(query)
+        self.api.push({'inline_query': {'id': query, 'from': user(id), 'query': '', 'offset': ''}})
+
+        try:
+            latency, items = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.api.inline.pop(query, None)
+            results.timeouts += 1
+            return None
+
+        results.latencies.append(latency)
+        return items
+
+
+    def choose(self, items: List[dict]) -> Optional[str]:
+        ids = [i['id'] for i in items]
+        cards = [i for i in ids if i.startswith('card:') or i.startswith('typec:') or i == 'queen']
+        if len(cards) > 0 and self.rng.random() < 0.8:
+            return self.rng.choice(cards)
+
+        for i in ['take', 'pass']:
+            if i in ids:
+                return i
+
+        return None
+
+
+    async def play(self, results: Callable[[], Results], max_actions: int = 300):
+        a, b = self.players
+
+        while True:
+            # inviting and accepting
+            sent = self.api.wait_message(self.chat)
+            self.api.push({'message': self.message(a, '/invite', reply_to=b)})
+            try:
+                await asyncio.wait_for(sent, self.timeout)
+            except asyncio.TimeoutError:
+                results().timeouts += 1
+                self.api.push({'message': self.message(a, '/leave')})
+                continue
+
+            self.api.push({'callback_query': {
+                'id': f'{a}:accept', 'from': user(b), 'chat_instance': str(self.chat),
+                'data': f'accept:{a}:{b}', 'message': self.message(a, 'приглашение')
+            }})
+
+            # both players look at their cards, the one who can moves
+            for _ in range(max_actions):
+                await asyncio.sleep(self.think * self.rng.uniform(0.5, 1.5))
+
+                answers = await asyncio.gather(*[self.query(i, results()) for i in self.players])
+                if any([i[0]['title'] == NOT_PLAYING for i in answers if i != None]):
+                    break
+
+                for id, items in zip(self.players, answers):
+                    result = self.choose(items or [])
+                    if result == None: continue
+
+                    self.api.push({'chosen_inline_result': {'result_id': result, 'from': user(id), 'query': ''}})
+                    results().actions += 1
+
+            else:
+                # stuck with an empty deck
+                self.api.push({'message': self.message(a, '/leave')})
+
+            results().games += 1
+
+
+def percentile(values: List[float], share: float) -> float:
+    if len(values) == 0: return 0.0
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * share))]
+
+
+async def run(args: argparse.Namespace):
+    api = FakeAPI()
+    runner = await api.serve(args.port)
+
+    directory = tempfile.mkdtemp(prefix='shulpek-load-')
+    env = dict(os.environ,
+        TOKEN=TOKEN,
+        API_URL=f'http://127.0.0.1:{args.port}',
+        MODE='polling',
+        DB_PATH=os.path.join(directory, 'shulpek.db'),
+        EVENT_LOG=os.path.join(directory, 'logs'),
+        METRICS_PORT='',
+        AI_WORKERS='1'
+    )
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'shulpek'], env=env,
+        cwd=os.path.dirname(os.path.abspath(__file__)),
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL if not args.verbose else None
+    )
+
+    current = Results()
+    pairs: List[asyncio.Task] = []
+    rows = []
+
+    try:
+        await asyncio.wait_for(api.polled.wait(), 30)
+        print(f'{"games":>6} {"actions/s":>10} {"api calls/s":>12} {"p50":>8} {"p95":>8} {"p99":>8} {"timeouts":>9}')
+
+        for level in args.levels:
+            while len(pairs) < level:
+                pair = Pair(api, len(pairs), args.think, args.timeout)
+                pairs.append(asyncio.create_task(pair.play(lambda: current)))
+
+            await asyncio.sleep(args.warmup)
+
+            current = Results()
+            calls = sum(api.calls.values())
+            start = time.perf_counter()
+            await asyncio.sleep(args.duration)
+            elapsed = time.perf_counter() - start
+
+            row = (
+                level,
+                current.actions / elapsed,
+                (sum(api.calls.values()) - calls) / elapsed,
+                percentile(current.latencies, 0.5) * 1000,
+                percentile(current.latencies, 0.95) * 1000,
+                percentile(current.latencies, 0.99) * 1000,
+                current.timeouts
+            )
+            rows.append(row)
+            print(f'{row[0]:>6} {row[1]:>10.1f} {row[2]:>12.1f} {row[3]:>6.0f}ms {row[4]:>6.0f}ms {row[5]:>6.0f}ms {row[6]:>9}')
+
+            if process.poll() != None:
+                print('the bot exited')
+                break
+
+    finally:
+        for i in pairs:
+            i.cancel()
+
+        process.terminate()
+        process.wait()
+        await runner.cleanup()
+
+    # saturated: answers got too slow, or more games stopped bringing more actions
+    for previous, row in zip([None] + rows, rows):
+        if row[5] > args.slo * 1000 or row[6] > 0:
+            print(f'saturated at {row[0]} games: p99 above {args.slo * 1000:.0f}ms or timeouts')
+            return
+
+        if previous != None and row[1] < previous[1] * (1 + 0.5 * (row[0] / previous[0] - 1)):
+            print(f'saturated at {row[0]} games: throughput grew {row[1] / previous[1]:.2f}x '
+                f'for {row[0] / previous[0]:.2f}x games')
+            return
+
+    print('not saturated')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Finds how many games one bot instance handles.')
+    parser.add_argument('--levels', type=int, nargs='+', default=[10, 50, 100, 250, 500, 1000], help='concurrent games')
+    parser.add_argument('--duration', type=float, default=15, help='seconds measured per level')
+    parser.add_argument('--warmup', type=float, default=3, help='seconds before measuring a level')
+    parser.add_argument('--think', type=float, default=1.0, help='average seconds between a player\'s actions')
+    parser.add_argument('--timeout', type=float, default=5.0, help='seconds to wait for an answer')
+    parser.add_argument('--slo', type=float, default=0.5, help='p99 inline answer latency limit in seconds')
+    parser.add_argument('--port', type=int, default=8081)
+    parser.add_argument('-v', '--verbose', action='store_true', help='show the bot\'s errors')
+    args = parser.parse_args()
+
+    asyncio.run(run(args))
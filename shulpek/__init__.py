@@ -0,0 +1,6 @@
+'''
+Shulpek, an Uno-like card game, and the Telegram bot playing it.
+
+The game itself (`engine`, `events`, `sim`, `ai`) doesn't need aiogram,
+the bot is in `main` and is started with `python -m shulpek`.
+'''
@@ -0,0 +1,107 @@
+'''
+Computer opponent choosing moves with Monte Carlo rollouts.
+'''
+from typing import *
+
+import random
+import time
+
+from . import config
+from . import engine
+from . import sim
+
+
+def candidates(game: engine.Game, id: int) -> List[tuple]:
+    '''
+    Returns every move the player can make.
+    '''
+    if game.type_chooser:
+        return [('suit', i) for i in config.TYPES]
+
+    player = game.players[id]
+    moves = [sim.take(game)]
+
+    if player.is_queen_winnable:
+        moves.append(('queen',))
+
+    legal = game.legal_moves(id)
+    for card in engine.bits(legal):
+        moves.append(('card', card))
+
+    return moves
+
+
+def determinize(data: dict, id: int, rng: random.Random) -> Tuple[engine.Game, sim.Recorder]:
+    '''
+    Restores the game, dealing the cards the player can't see at random.
+    '''
+    recorder = sim.Recorder()
+    game = engine.Game.from_dict(recorder.emit, data)
+    opponent = game.players[game.get_other_player(id)]
+
+    # the opponent's hand and the deck are hidden
+    hidden = [engine.DECK[i] for i in engine.bits(opponent.hand)] + game.deck
+    rng.shuffle(hidden)
+
+    count = opponent.count
+    opponent.hand = engine.mask_of([i.index for i in hidden[:count]])
+    game.deck = hidden[count:]
+
+    return game, recorder
+
+
+def lead(game: engine.Game, id: int) -> int:
+    '''
+    Returns how many more points the opponent has than the player.
+    '''
+    other = game.get_other_player(id)
+    return game.players[other].pts - game.players[id].pts
+
+
+def rollout(game: engine.Game, recorder: sim.Recorder, id: int,
+    rng: random.Random, max_moves: int) -> int:
+    '''
+    Plays the round out with random moves and returns the player's lead.
+    '''
+    other = game.get_other_player(id)
+
+    for _ in range(max_moves):
+        if game.waiting or recorder.over: break
+
+        sim.apply(game, game.turn, sim.random_policy(game, game.turn, rng))
+
+    # an unfinished round is judged by what is left in the hands
+    result = lead(game, id)
+    if not game.waiting and not recorder.over:
+        result += game.players[other].cost - game.players[id].cost
+
+    return result
+
+
+def choose(data: dict, id: int, budget: float, max_moves: int = 200) -> tuple:
+    '''
+    Returns the best move for the player in a game snapshot,
+    spending about `budget` seconds on the search.
+    '''
+    deadline = time.perf_counter() + budget
+    rng = random.Random()
+
+    game, _ = determinize(data, id, rng)
+    moves = candidates(game, id)
+    if len(moves) == 1:
+        return moves[0]
+
+    scores = [0] * len(moves)
+    counts = [0] * len(moves)
+
+    # scores are compared, so the current lead doesn't matter
+    while time.perf_counter() < deadline:
+        for index, move in enumerate(moves):
+            game, recorder = determinize(data, id, rng)
+            sim.apply(game, id, move)
+
+            scores[index] += rollout(game, recorder, id, rng, max_moves)
+            counts[index] += 1
+
+    best = max(range(len(moves)), key=lambda i: scores[i] / max(counts[i], 1))
+    return moves[best]
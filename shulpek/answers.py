@@ -0,0 +1,145 @@
+'''
+Inline query answers, cached per game state version.
+'''
+from typing import *
+
+from aiogram import types
+
+from . import config
+from . import engine
+
+
+def article(id: str, title: str, text: str, description: str = None) -> types.InlineQueryResultArticle:
+    return types.InlineQueryResultArticle(
+        id=id,
+        title=title,
+        description=description,
+        input_message_content=types.InputTextMessageContent(
+            message_text=text
+        )
+    )
+
+
+# answers that don't depend on the game
+
+NOT_PLAYING = [article('discard', 'ты сейчас не играешь!', 'привет')]
+WAITING = [article('discard', 'жди нового раунда!', 'привет')]
+NOT_ACCEPTED = [article('cancel', 'оппонент не принял заявку!', 'лан не передумал', '❌ нажми чтобы покинуть игру')]
+NOT_TURN = article('cancel', 'сейчас не твой ход!', 'я слился', '❌ нажми чтобы покинуть игру')
+SUITS = [
+    article(f'typec:{i}', f'{i} {config.NAMES[i]}', f'{i} {config.NAMES[i]}')
+    for i in config.TYPES
+]
+
+
+def hand(player: engine.Player) -> types.InlineQueryResultArticle:
+    cards = player.cards
+
+    return article(
+        'discard',
+        f'твои карты ({len(cards)})',
+        'привет!',
+        ' ・ '.join([str(i) for i in cards])
+    )
+
+
+def build(game: engine.Game, id: int) -> List[types.InlineQueryResultArticle]:
+    '''
+    Builds the inline answer for a player.
+    '''
+    if game is None:
+        return NOT_PLAYING
+
+    if game.waiting:
+        return WAITING
+
+    if not game.ready:
+        return NOT_ACCEPTED
+
+    # not your turn
+    if id != game.turn:
+        return [NOT_TURN, hand(game.players[id])]
+
+    # suit picker
+    if game.type_chooser:
+        return SUITS + [hand(game.players[id])]
+
+    # card picker, an id names the exact move so a repeated tap is rejected
+    items = [
+        article('take', '🔁 взять карту', 'беру') if not game.took else
+        article('pass', '⏩ пропустить ход', 'пропускаю')
+    ]
+
+    player = game.players[id]
+
+    if player.is_queen_winnable:
+        items.append(article('queen', f'👑 списать дамами (-{player.cost})', 'списываю!!'))
+
+    legal = game.legal_moves(id)
+
+    for index, i in enumerate(player.cards):
+        if legal >> i.index & 1:
+            items.append(article(f'card:{i.index}', str(i), str(i)))
+        else:
+            items.append(article(f'discard{index}', '❌ ' + str(i), 'этой картой играть нельзя!'))
+
+    return items
+
+
+class Answers:
+    def __init__(self):
+        '''
+        Caches the inline answer of every player until their game changes.
+        '''
+        # user -> (game, version, items)
+        self.cache: Dict[int, Tuple[engine.Game, int, list]] = {}
+
+
+    def get(self, game: engine.Game, id: int) -> List[types.InlineQueryResultArticle]:
+        if game is None:
+            return NOT_PLAYING
+
+        cached = self.cache.get(id)
+        if cached != None and cached[0] is game and cached[1] == game.version:
+            return cached[2]
+
+        items = build(game, id)
+        self.cache[id] = (game, game.version, items)
+
+        return items
+
+
+    def forget(self, game: engine.Game):
+        '''
+        Drops the answers of a finished game.
+        '''
+        for i in game.players:
+            if i in self.cache and self.cache[i][0] is game:
+                self.cache.pop(i)
+
+
+class Coalescer:
+    def __init__(self):
+        '''
+        Runs one handler per key at a time. Calls arriving meanwhile
+        replace each other, so only the latest one runs afterwards.
+        '''
+        self.running: Set[Hashable] = set()
+        self.pending: Dict[Hashable, Any] = {}
+
+
+    async def run(self, key: Hashable, item: Any, handler: Callable[[Any], Awaitable]):
+        if key in self.running:
+            self.pending[key] = item
+            return
+
+        self.running.add(key)
+
+        try:
+            while item != None:
+                await handler(item)
+                item = self.pending.pop(key, None)
+
+        finally:
+            self.running.discard(key)
+            self.pending.pop(key, None)
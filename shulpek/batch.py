@@ -0,0 +1,368 @@
+'''
+Vectorized engine playing many games in lockstep, for balance analysis.
+Requires numpy.
+
+    python -m shulpek.batch -n 100000
+    python -m shulpek.batch --check 500
+'''
+from typing import *
+
+import argparse
+import random
+import time
+
+import numpy as np
+
+from . import config
+from . import engine
+from . import sim
+
+
+# tables
+
+COUNT = len(engine.CARDS)
+SHIFTS = np.arange(COUNT, dtype=np.uint64)
+ONE = np.uint64(1)
+
+HITTABLE = np.array(engine.HITTABLE, dtype=np.uint64)
+COSTS = np.array(engine.CARD_COSTS, dtype=np.int32)
+FULL_DECK = np.uint64(engine.FULL_DECK)
+QUEENS = np.uint64(engine.QUEENS)
+
+# what can be dropped on a queen of the chosen suit
+SUIT_HITTABLE = np.array(
+    [engine.HITTABLE[engine.card_index('Q', i)] for i in config.TYPES],
+    dtype=np.uint64
+)
+
+# cards that keep the turn
+VALUES = np.array([engine.CARDS[i][0] for i in range(COUNT)])
+KEEPS_TURN = np.isin(VALUES, ['6', '7', 'Q', 'A'])
+IS_SIX = VALUES == '6'
+IS_QUEEN = VALUES == 'Q'
+
+# actions
+CARD, TAKE, QUEEN, SUIT = 0, 1, 2, 3
+
+
+def to_matrix(masks: np.ndarray) -> np.ndarray:
+    '''
+    Expands bitsets into an (n, 36) bool matrix.
+    '''
+    return (masks[:, None] >> SHIFTS) & ONE == ONE
+
+
+def lowest(masks: np.ndarray) -> np.ndarray:
+    '''
+    Returns the index of the lowest card of each non-empty bitset.
+    '''
+    low = masks & (~masks + ONE)
+    return np.log2(low.astype(np.float64)).astype(np.int64)
+
+
+class Batch:
+    def __init__(self, games: int, seed: int = 0, exact: bool = False):
+        '''
+        Represents `games` games between players 0 and 1.
+
+        With `exact`, decks and first turns come from the same
+        per-game RNG as `engine.Game` seeded with `seed + i`,
+        so the results can be compared with the scalar engine.
+        '''
+        self.n: int = games
+        self.seed: int = seed
+        self.exact: bool = exact
+        self.rng = np.random.default_rng(seed)
+
+        self.hands = np.zeros((games, 2), dtype=np.uint64)
+        self.deck = np.zeros((games, COUNT), dtype=np.int64)
+        self.size = np.zeros(games, dtype=np.int64)
+        self.stack = np.full(games, -1, dtype=np.int64)
+        self.suit = np.full(games, -1, dtype=np.int64)
+        self.turn = np.zeros(games, dtype=np.int64)
+        self.loser = np.full(games, -1, dtype=np.int64)
+        self.pts = np.zeros((games, 2), dtype=np.int64)
+        self.took = np.zeros(games, dtype=bool)
+        self.chooser = np.zeros(games, dtype=bool)
+        self.round = np.zeros(games, dtype=np.int64)
+        self.moves = np.zeros(games, dtype=np.int64)
+        self.over = np.zeros(games, dtype=bool)
+
+        self.new_round(np.arange(games))
+
+
+    @property
+    def active(self) -> np.ndarray:
+        return np.flatnonzero(~self.over)
+
+
+    def new_round(self, games: np.ndarray):
+        '''
+        Shuffles, deals and chooses the first turn, like `Game.start_round`.
+        '''
+        self.round[games] += 1
+        self.hands[games] = 0
+        self.stack[games] = -1
+        self.suit[games] = -1
+        self.chooser[games] = False
+
+        first = self.loser[games] < 0
+        self.turn[games] = 1 - self.loser[games]
+
+        if self.exact:
+            for i, game in enumerate(games):
+                rng = random.Random((self.seed + int(game)) * 1024 + int(self.round[game]))
+
+                deck = list(range(COUNT))
+                rng.shuffle(deck)
+                self.deck[game] = deck
+
+                if first[i]:
+                    self.turn[game] = rng.choice([1, 2]) - 1
+        else:
+            self.deck[games] = np.argsort(self.rng.random((len(games), COUNT)), axis=1)
+            self.turn[games[first]] = self.rng.integers(0, 2, first.sum())
+
+        self.size[games] = COUNT
+        for player in [0, 1]:
+            for _ in range(4):
+                self.draw(games, np.full(len(games), player))
+
+
+    def draw(self, games: np.ndarray, players: np.ndarray):
+        '''
+        Moves the top card of the deck to the players' hands.
+        '''
+        has = self.size[games] > 0
+        games = games[has]
+        players = players[has]
+
+        self.size[games] -= 1
+        cards = self.deck[games, self.size[games]]
+        self.hands[games, players] |= ONE << cards.astype(np.uint64)
+
+
+    def playable(self, games: np.ndarray) -> np.ndarray:
+        '''
+        Returns the bitsets of the cards that can be dropped on the stacks.
+        '''
+        stack = self.stack[games]
+        suit = self.suit[games]
+
+        result = HITTABLE[np.maximum(stack, 0)]
+        result = np.where(suit >= 0, SUIT_HITTABLE[np.maximum(suit, 0)], result)
+        return np.where(stack < 0, FULL_DECK, result)
+
+
+    def legal(self, games: np.ndarray) -> np.ndarray:
+        return self.hands[games, self.turn[games]] & self.playable(games)
+
+
+    def cost(self, hands: np.ndarray) -> np.ndarray:
+        return to_matrix(hands) @ COSTS
+
+
+    def step(self, policy: Callable[["Batch", np.ndarray], Tuple[np.ndarray, np.ndarray]]):
+        '''
+        Applies one move of the policy in every unfinished game.
+        '''
+        games = self.active
+        if len(games) == 0: return
+
+        kind, arg = policy(self, games)
+        turn = self.turn[games]
+        other = 1 - turn
+
+        # choosing the suit of a queen
+        chosen = games[kind == SUIT]
+        self.suit[chosen] = arg[kind == SUIT]
+        self.chooser[chosen] = False
+        self.turn[chosen] = 1 - self.turn[chosen]
+
+        # dropping a card
+        mask = kind == CARD
+        played = games[mask]
+        cards = arg[mask]
+        self.hands[played, turn[mask]] &= ~(ONE << cards.astype(np.uint64))
+        self.stack[played] = cards
+        self.suit[played] = -1
+        self.took[played] = False
+
+        passes = ~KEEPS_TURN[cards]
+        self.turn[played[passes]] = other[mask][passes]
+
+        sixes = IS_SIX[cards]
+        for _ in range(2):
+            self.draw(played[sixes], other[mask][sixes])
+
+        self.chooser[played[IS_QUEEN[cards]]] = True
+
+        # flushing queens
+        mask = kind == QUEEN
+        flushed = games[mask]
+        self.pts[flushed, turn[mask]] -= self.cost(self.hands[flushed, turn[mask]])
+        self.hands[flushed, turn[mask]] = 0
+
+        # taking a card or passing
+        mask = kind == TAKE
+        taking = games[mask]
+        took = self.took[taking]
+
+        self.draw(taking[~took], turn[mask][~took])
+        self.took[taking[~took]] = True
+
+        self.turn[taking[took]] = other[mask][took]
+        self.took[taking[took]] = False
+
+        self.moves[games] += 1
+        self.check_end(games)
+
+
+    def check_end(self, games: np.ndarray):
+        '''
+        Ends the rounds where a player has no cards left.
+        '''
+        empty = self.hands[games] == 0
+        ended = empty[:, 0] | empty[:, 1]
+        games = games[ended]
+        if len(games) == 0: return
+
+        # the first player without cards wins
+        loser = np.where(empty[ended, 0], 1, 0)
+        self.loser[games] = loser
+        self.pts[games, loser] += self.cost(self.hands[games, loser])
+
+        finished = (self.pts[games] >= 105).any(axis=1)
+        self.over[games[finished]] = True
+        self.new_round(games[~finished])
+
+
+    def run(self, policy: Callable, max_moves: int = 5000):
+        '''
+        Steps until every game is over or has made `max_moves` moves.
+        '''
+        while True:
+            self.over |= self.moves >= max_moves
+            if self.over.all(): break
+
+            self.step(policy)
+
+
+    @property
+    def stalled(self) -> np.ndarray:
+        return (self.pts < 105).all(axis=1)
+
+
+# policies
+# a policy returns the action kinds and their arguments for the games
+
+def first_policy(batch: Batch, games: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Flushes queens, otherwise drops the lowest playable card, otherwise takes.
+    A queen gets the suit of the lowest card left in the hand.
+    '''
+    hands = batch.hands[games, batch.turn[games]]
+    legal = batch.legal(games)
+    kind = np.full(len(games), TAKE)
+    arg = np.zeros(len(games), dtype=np.int64)
+
+    playing = legal != 0
+    kind[playing] = CARD
+    arg[playing] = lowest(legal[playing])
+
+    queens = (hands != 0) & (hands & ~QUEENS == 0)
+    kind[queens] = QUEEN
+
+    choosing = batch.chooser[games]
+    kind[choosing] = SUIT
+    with_cards = choosing & (hands != 0)
+    arg[choosing] = 0
+    arg[with_cards] = lowest(hands[with_cards]) % len(config.TYPES)
+
+    return kind, arg
+
+
+def random_policy(batch: Batch, games: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    '''
+    Drops a random playable card, sometimes takes instead.
+    '''
+    legal = batch.legal(games)
+    kind = np.full(len(games), TAKE)
+
+    keys = np.where(to_matrix(legal), batch.rng.random((len(games), COUNT)), -1.0)
+    arg = keys.argmax(axis=1)
+
+    playing = (legal != 0) & (batch.rng.random(len(games)) < 0.8)
+    kind[playing] = CARD
+
+    choosing = batch.chooser[games]
+    kind[choosing] = SUIT
+    arg[choosing] = batch.rng.integers(0, len(config.TYPES), choosing.sum())
+
+    return kind, arg
+
+
+def first_policy_scalar(game: engine.Game, id: int, rng: random.Random) -> tuple:
+    '''
+    `first_policy` for `sim.play`.
+    '''
+    player = game.players[id]
+
+    if game.type_chooser:
+        if player.hand == 0:
+            return ('suit', config.TYPES[0])
+        return ('suit', config.TYPES[next(engine.bits(player.hand)) % len(config.TYPES)])
+
+    if player.hand != 0 and player.is_queen_winnable:
+        return ('queen',)
+
+    legal = game.legal_moves(id)
+    if legal:
+        return ('card', next(engine.bits(legal)))
+
+    return sim.take(game)
+
+
+def check(games: int, seed: int = 0, max_moves: int = 5000) -> int:
+    '''
+    Plays the same seeded games on both engines and returns the amount of mismatches.
+    '''
+    batch = Batch(games, seed, exact=True)
+    batch.run(first_policy, max_moves)
+
+    mismatches = 0
+    for i in range(games):
+        result = sim.play(seed + i, [first_policy_scalar] * 2, max_moves)
+
+        if result['pts'] != list(batch.pts[i]) or result['rounds'] != batch.round[i] \
+            or result['moves'] != batch.moves[i]:
+            mismatches += 1
+            print(f'mismatch in game {seed + i}: scalar {result}, '
+                f'batch pts {list(batch.pts[i])} rounds {batch.round[i]} moves {batch.moves[i]}')
+
+    return mismatches
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plays Shulpek games in lockstep with numpy.')
+    parser.add_argument('-n', '--games', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--policy', default='random', choices=['random', 'first'])
+    parser.add_argument('--check', type=int, default=0, help='compare this many games with the scalar engine')
+    args = parser.parse_args()
+
+    if args.check > 0:
+        mismatches = check(args.check, args.seed)
+        print(f'{args.check - mismatches}/{args.check} games match the scalar engine')
+
+    else:
+        start = time.perf_counter()
+        batch = Batch(args.games, args.seed)
+        batch.run(random_policy if args.policy == 'random' else first_policy)
+        elapsed = time.perf_counter() - start
+
+        over = ~batch.stalled
+        print(f'games: {args.games} in {elapsed:.1f}s ({args.games / elapsed:.0f} games/s)')
+        print(f'stalled: {(~over).sum()}')
+        print(f'avg rounds: {batch.round[over].mean():.2f}')
+        print(f'avg moves: {batch.moves[over].mean():.1f}')
@@ -0,0 +1,29 @@
+VALUES = ['A', '6', '7', '8', '9', '10', 'J', 'Q', 'K']
+TYPES = ['♣', '♦', '♥', '♠']
+NAMES = {
+    "♣": "крести",
+    "♦": "бубны",
+    "♥": "черви",
+    "♠": "пики"
+}
+
+# timeouts in seconds
+ROUND_DELAY = 10
+
+# seconds without any action before a game is removed, by its phase
+IDLE_LIMITS = {
+    'invite': 300,
+    'playing': 300,
+    'waiting': 60
+}
+
+# Bot API call timeouts in seconds, other calls use aiogram's default
+API_TIMEOUTS = {
+    'AnswerInlineQuery': 5,
+    'AnswerCallbackQuery': 5,
+    'SendMessage': 15,
+    'EditMessageText': 15
+}
+
+# seconds the computer thinks about a move
+AI_BUDGET = 2.0
\ No newline at end of file
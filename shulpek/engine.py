@@ -0,0 +1,599 @@
+
+from . import config
+import time
+import random
+import functools
+from . import events
+from .events import Event
+from typing import * 
+
+# game
+
+def transition(method: Callable) -> Callable:
+    '''
+    Marks a game method that changes the state.
+
+    Game methods never wait for anything, so an action is applied
+    entirely before any other code runs and needs no lock. The method
+    returns whether the action was accepted, only then the state
+    version changes and the action counts as activity for idle eviction.
+    '''
+    @functools.wraps(method)
+    def wrapper(self: "Game", *args, **kwargs):
+        result = method(self, *args, **kwargs)
+
+        if result:
+            self.version += 1
+            self.active = time.monotonic()
+
+        return result
+
+    return wrapper
+        
+
+# cards
+# every card has an index in `CARDS`, so a set of cards fits into an int
+
+CARDS: List[Tuple[str, str]] = [(i, j) for i in config.VALUES for j in config.TYPES]
+
+COSTS: Dict[str, int] = {
+    'A': 11,
+    '6': 6,
+    '7': 7,
+    '8': 8,
+    '9': 9,
+    '10': 10,
+    'J': 2,
+    'Q': 20,
+    'K': 4
+}
+
+
+def card_index(value: str, type: str) -> int:
+    '''
+    Returns the index of a card in `CARDS`.
+    '''
+    return config.VALUES.index(value) * len(config.TYPES) + config.TYPES.index(type)
+
+
+def bits(mask: int) -> Iterator[int]:
+    '''
+    Yields the indexes of the cards in a bitset, lowest first.
+    '''
+    while mask:
+        low = mask & -mask
+        yield low.bit_length() - 1
+        mask ^= low
+
+
+def mask_of(cards: Iterable[int]) -> int:
+    '''
+    Returns the bitset of the card indexes.
+    '''
+    mask = 0
+    for i in cards:
+        mask |= 1 << i
+
+    return mask
+
+
+FULL_DECK: int = (1 << len(CARDS)) - 1
+QUEENS: int = mask_of([i for i, card in enumerate(CARDS) if card[0] == 'Q'])
+
+CARD_COSTS: List[int] = [
+    40 if (value, type) == ('Q', '♠') else COSTS[value]
+    for value, type in CARDS
+]
+
+# HITTABLE[i] is the bitset of the cards that can be dropped on card i
+HITTABLE: List[int] = [
+    FULL_DECK if value == 'A' else mask_of([
+        j for j, (other_value, other_type) in enumerate(CARDS)
+        if other_value == 'Q' or other_type == type or other_value == value
+    ])
+    for value, type in CARDS
+]
+
+
+class Card:
+    __slots__ = ('value', 'type', 'index')
+
+    def __init__(self, value: str, type: str):
+        '''
+        Represents a card. Cards are immutable and shared,
+        use `get_card` or `DECK` instead of creating new ones.
+        '''
+        object.__setattr__(self, 'value', value)
+        object.__setattr__(self, 'type', type)
+        object.__setattr__(self, 'index', card_index(value, type))
+
+
+    def __setattr__(self, name: str, value: Any):
+        raise AttributeError('cards are immutable')
+
+
+    @property
+    def cost(self):
+        return CARD_COSTS[self.index]
+    
+    
+    def is_hittable_on(self, card: "Card") -> bool:
+        return HITTABLE[card.index] >> self.index & 1 == 1
+    
+
+    def __str__(self) -> str:
+        return f'{self.value}{self.type}'
+
+
+# every card, created once
+DECK: Tuple[Card, ...] = tuple([Card(*i) for i in CARDS])
+
+
+def get_card(value: str, type: str) -> Card:
+    '''
+    Returns the shared card instance.
+    '''
+    return DECK[card_index(value, type)]
+    
+
+class Player:
+    def __init__(self,
+        id: int, name: str
+    ):
+        self.id: int = id
+        self.name: str = name
+        self.hand: int = 0
+        self.pts: int = 0
+
+
+    @property
+    def mention(self) -> str:
+        return f'<a href="tg://user?id={self.id}">{self.name}</a>'
+
+
+    @property
+    def cards(self) -> List[Card]:
+        '''
+        Cards in the hand, ordered by their index.
+        '''
+        return [DECK[i] for i in bits(self.hand)]
+
+
+    @property
+    def count(self) -> int:
+        return self.hand.bit_count()
+
+
+    @property
+    def cost(self) -> int:
+        return sum([CARD_COSTS[i] for i in bits(self.hand)])
+
+    
+    @property
+    def is_queen_winnable(self) -> bool:
+        return self.hand & ~QUEENS == 0
+
+
+class Game:
+    def __init__(self,
+        emit: Callable[[Event], Any],
+        players: List[Tuple[int,str]],
+        chat: int,
+        message: int,
+        seed: int = None
+    ):
+        '''
+        Represents an ongoing game.
+
+        Everything that happens in the game is passed to `emit`.
+        '''
+        self.emit: Callable[[Event], Any] = emit
+        self.id: int = players[0][0]
+        self.seed: int = seed if seed != None else random.getrandbits(32)
+        self.rng: random.Random = random.Random(self.seed)
+
+        self.players: Dict[int, Player] = {
+            i[0]: Player(*i) for i in players
+        }
+        self.ready = False
+        self.over = False
+        self.waiting = False
+        self.type_chooser = False
+        self.round = 0
+
+        self.turn: int = None
+        self.loser: int = None
+        self.loser_earned: str = ''
+        self.winner_subbed: str = ''
+        self.deck: List[Card] = []
+        self.played: int = 0
+        self.stack: Card = None
+        self.suit: str = None
+        self.took = False
+
+        self.chat: int = chat
+        self.message: int = message
+        self.version: int = 0
+
+        # monotonic time of the last action, not stored in snapshots
+        self.active: float = time.monotonic()
+
+
+    def to_dict(self) -> dict:
+        '''
+        Returns a snapshot of the game that can be stored as JSON.
+        '''
+        return {
+            'id': self.id,
+            'seed': self.seed,
+            'players': [[i.id, i.name, i.hand, i.pts] for i in self.players.values()],
+            'ready': self.ready,
+            'waiting': self.waiting,
+            'type_chooser': self.type_chooser,
+            'round': self.round,
+            'turn': self.turn,
+            'loser': self.loser,
+            'loser_earned': self.loser_earned,
+            'winner_subbed': self.winner_subbed,
+            'deck': [i.index for i in self.deck],
+            'played': self.played,
+            'stack': self.stack.index if self.stack != None else None,
+            'suit': self.suit,
+            'took': self.took,
+            'chat': self.chat,
+            'message': self.message
+        }
+
+
+    @classmethod
+    def from_dict(cls, emit: Callable[[Event], Any], data: dict) -> "Game":
+        '''
+        Restores a game from a snapshot made by `to_dict`.
+        '''
+        game = cls(
+            emit,
+            [(i[0], i[1]) for i in data['players']],
+            data['chat'],
+            data['message'],
+            data['seed']
+        )
+
+        for id, _, hand, pts in data['players']:
+            game.players[id].hand = hand
+            game.players[id].pts = pts
+
+        game.ready = data['ready']
+        game.waiting = data['waiting']
+        game.type_chooser = data['type_chooser']
+        game.round = data['round']
+        game.turn = data['turn']
+        game.loser = data['loser']
+        game.loser_earned = data['loser_earned']
+        game.winner_subbed = data['winner_subbed']
+        game.deck = [DECK[i] for i in data['deck']]
+        game.played = data['played']
+        game.stack = DECK[data['stack']] if data['stack'] != None else None
+        game.suit = data['suit']
+        game.took = data['took']
+
+        return game
+
+
+    def add_card(self, id: int) -> bool:
+        '''
+        Adds a card to a player from the top of the deck.
+        The top of the deck is the end of the list.
+        '''
+        if len(self.deck) == 0:
+            return False
+
+        self.players[id].hand |= 1 << self.deck.pop().index
+        return True
+
+
+    def shuffle_deck(self):
+        '''
+        Shuffles the deck.
+        '''
+        self.deck = list(DECK)
+        self.rng.shuffle(self.deck)
+
+
+    def redistribute_cards(self):
+        '''
+        Adds necessary cards to each player.
+        '''
+        for i in self.players.values():
+            amount = 4 - i.count
+            for _ in range(amount):
+                self.add_card(i.id)
+
+
+    def choose_next(self):
+        '''
+        Chooses the next player to play.
+        '''
+        if self.loser == None:
+            self.turn = self.rng.choice(list(self.players.keys()))
+
+        else:
+            self.turn = self.get_other_player(self.loser)
+
+
+    def get_other_player(self, id: int) -> int:
+        '''
+        Returns the ID of the other player based on the passed in ID.
+        '''
+        if id == list(self.players.keys())[0]:
+            return list(self.players.keys())[1]
+
+        return list(self.players.keys())[0]
+
+
+    @transition
+    def ready_up(self) -> bool:
+        '''
+        Gets called when the opponent accepts the game.
+        '''
+        if self.ready or self.over: return False
+
+        self.ready = True
+
+        self.emit(events.GameStarted(self))
+        self.start_round()
+        return True
+        
+
+    @transition
+    def new_round(self) -> bool:
+        '''
+        Starts the new round.
+        '''
+        if self.over or not self.waiting: return False
+
+        self.start_round()
+        return True
+
+
+    @transition
+    def end(self, reason: str) -> bool:
+        '''
+        Ends the game, `reason` is passed on to `GameOver`.
+        '''
+        if self.over: return False
+
+        self.over = True
+        self.emit(events.GameOver(self, reason))
+        return True
+
+
+    def start_round(self):
+        '''
+        Resets the round state and deals the cards.
+        '''
+        # stuff
+        self.round += 1
+        self.waiting = False
+        self.type_chooser = False
+        self.stack = None
+        self.suit = None
+        self.played = 0
+
+        # every round can be reproduced from the seed
+        self.rng.seed(self.seed * 1024 + self.round)
+
+        # shuffling deck
+        self.shuffle_deck()
+        self.redistribute_cards()
+        self.choose_next()
+
+        self.emit(events.RoundStarted(self, self.round))
+
+
+    def round_end(self):
+        '''
+        Called when the round ends.
+        '''
+        self.waiting = True
+        
+        # points
+        player = self.players[self.loser]
+        cost = player.cost
+
+        player.pts += cost
+        self.loser_earned = ''.join(
+            [f' {i} - <code>{i.cost}</code>\n' for i in player.cards]
+        ) + f'<code>+ {cost}</code>'
+
+        # removing cards
+        for i in self.players.values():
+            i.hand = 0
+
+        self.emit(events.RoundEnded(self, self.loser, cost))
+
+        # checking for game end
+        for i in self.players.values():
+            if i.pts >= 105:
+                self.end('points')
+                return
+
+
+    def check_end(self):
+        '''
+        Checks if the round should end.
+        '''
+        for i in self.players.values():
+            if i.hand == 0:
+                self.loser = self.get_other_player(i.id)
+                self.round_end()
+                return
+
+
+    @property
+    def playable(self) -> int:
+        '''
+        Returns the bitset of the cards that can be dropped on the stack.
+        '''
+        if self.stack == None:
+            return FULL_DECK
+
+        # a queen counts as a card of the chosen suit
+        if self.suit != None:
+            return HITTABLE[card_index('Q', self.suit)]
+
+        return HITTABLE[self.stack.index]
+
+
+    def legal_moves(self, id: int) -> int:
+        '''
+        Returns the bitset of the player's cards that can be dropped.
+        '''
+        return self.players[id].hand & self.playable
+
+
+    def can_act(self, id: int) -> bool:
+        '''
+        Returns whether the player can make a move right now.
+        '''
+        return self.ready and not self.over and not self.waiting and id == self.turn
+
+
+    @transition
+    def use_card(self, id: int, index: int) -> bool:
+        '''
+        Uses a card, `index` is its index in `DECK`.
+        '''
+        if not self.can_act(id) or self.type_chooser:
+            return False
+
+        if index < 0 or index >= len(DECK):
+            return False
+
+        player = self.players[id]
+        card = DECK[index]
+        
+        # checking if the card is in the hand and hittable
+        if self.legal_moves(id) >> card.index & 1:
+            self.stack = card
+            self.suit = None
+            player.hand &= ~(1 << card.index)
+            self.played |= 1 << card.index
+
+        else:
+            return False
+        
+        self.took = False
+        self.emit(events.CardPlayed(self, id, card))
+
+        if card.value not in ["6", "7", "Q", "A"]:
+            self.turn = self.get_other_player(id)
+            self.check_end()
+            return True
+        
+        # card specials
+        if card.value == '6':
+            to_give = self.get_other_player(id)
+            count = self.add_card(to_give) + self.add_card(to_give)
+            if count > 0:
+                self.emit(events.CardsDrawn(self, to_give, count, penalty=True))
+
+        if card.value == 'Q':
+            self.type_chooser = True
+
+        self.check_end()
+        return True
+
+
+    @transition
+    def queen_end(self, id: int) -> bool:
+        '''
+        Ends the game with all queens.
+        '''
+        if not self.can_act(id) or self.type_chooser:
+            return False
+
+        if not self.players[id].is_queen_winnable:
+            return False
+        
+        amount = self.players[id].cost
+        self.winner_subbed = f'\n\n<b>{self.players[id].mention} списал дамами!</b>\n'\
+            f'{" ".join([i.type for i in self.players[id].cards])} = <code>-{amount}</code>'
+
+        self.players[id].pts -= amount
+        self.players[id].hand = 0
+
+        self.emit(events.QueenFlush(self, id, amount))
+        self.check_end()
+        return True
+
+
+    @transition
+    def take_card(self, id: int) -> bool:
+        '''
+        Takes a card, only once a turn.
+        '''
+        if not self.can_act(id) or self.type_chooser or self.took:
+            return False
+
+        self.took = True
+        self.emit(events.CardsDrawn(self, id, int(self.add_card(id))))
+
+        self.check_end()
+        return True
+
+
+    @transition
+    def pass_turn(self, id: int) -> bool:
+        '''
+        Passes the turn after taking a card.
+        '''
+        if not self.can_act(id) or self.type_chooser or not self.took:
+            return False
+
+        self.turn = self.get_other_player(id)
+        self.took = False
+        self.emit(events.TurnPassed(self, id))
+
+        self.check_end()
+        return True
+    
+
+    @transition
+    def answer_type_chooser(self, id: int, type: str) -> bool:
+        if not self.can_act(id) or not self.type_chooser:
+            return False
+
+        if self.stack.value != "Q" or type not in config.TYPES:
+            return False
+
+        self.suit = type
+        self.type_chooser = False
+        self.turn = self.get_other_player(id)
+        
+        self.emit(events.SuitChosen(self, id, type))
+        self.check_end()
+        return True
+    
+
+    def act(self, id: int, action: tuple) -> bool:
+        '''
+        Makes a move described as ('card', index), ('take',), ('pass',), ('queen',) or ('suit', type).
+
+        Every action names exactly what the player meant, so a repeated
+        one is rejected instead of making the next move.
+        '''
+        method = ACTIONS.get(action[0])
+        if method == None:
+            return False
+
+        return method(self, id, *action[1:])
+
+
+# action name -> game method making the move
+ACTIONS: Dict[str, Callable[..., bool]] = {
+    'card': Game.use_card,
+    'take': Game.take_card,
+    'pass': Game.pass_turn,
+    'queen': Game.queen_end,
+    'suit': Game.answer_type_chooser
+}
@@ -0,0 +1,305 @@
+'''
+Append-only binary log of the game actions, and a replay tool.
+
+Every game starts with a record holding its seed, then every
+action is a record of the same size, so a game can be rebuilt
+step by step from its log:
+
+    python -m shulpek.eventlog logs                 # list the games
+    python -m shulpek.eventlog logs 12345 --step 10 # show a game after 10 actions
+'''
+from typing import *
+
+import argparse
+import asyncio
+import datetime
+import os
+import struct
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import config
+from . import engine
+from . import events
+from . import render
+
+
+# time, game, kind, player, argument
+RECORD = struct.Struct('<IqBqq')
+
+START = 0  # player is the opponent, argument is the seed
+ROUND = 1
+CARD = 2   # argument is the card index
+TAKE = 3
+SUIT = 4   # argument is the index in `config.TYPES`
+QUEEN = 5
+END = 6    # argument is the index in `REASONS`
+
+KINDS = ['start', 'round', 'card', 'take', 'suit', 'queen', 'end']
+REASONS = ['points', 'left', 'idle']
+
+
+def encode(event: events.Event, now: int) -> Optional[bytes]:
+    '''
+    Returns the record of the action that caused the event,
+    or None if the event follows from another action.
+    '''
+    game = event.game
+
+    if isinstance(event, events.GameStarted):
+        return RECORD.pack(now, game.id, START, game.get_other_player(game.id), game.seed)
+
+    # the first round is started by accepting the game
+    if isinstance(event, events.RoundStarted) and event.number > 1:
+        return RECORD.pack(now, game.id, ROUND, 0, 0)
+
+    if isinstance(event, events.CardPlayed):
+        return RECORD.pack(now, game.id, CARD, event.player, event.card.index)
+
+    # cards given by a six come from the card itself
+    if isinstance(event, events.CardsDrawn) and not event.penalty:
+        return RECORD.pack(now, game.id, TAKE, event.player, 0)
+
+    if isinstance(event, events.TurnPassed):
+        return RECORD.pack(now, game.id, TAKE, event.player, 0)
+
+    if isinstance(event, events.SuitChosen):
+        return RECORD.pack(now, game.id, SUIT, event.player, config.TYPES.index(event.suit))
+
+    if isinstance(event, events.QueenFlush):
+        return RECORD.pack(now, game.id, QUEEN, event.player, 0)
+
+    if isinstance(event, events.GameOver) and game.ready:
+        return RECORD.pack(now, game.id, END, 0, REASONS.index(event.reason))
+
+    return None
+
+
+class EventLog:
+    def __init__(self,
+        directory: str,
+        max_bytes: int = 16 * 1024 * 1024,
+        backups: int = 10,
+        interval: float = 1.0
+    ):
+        '''
+        Writes the actions of every game to numbered files in a directory.
+
+        Records are collected in memory and written every `interval`
+        seconds on a background thread. A file bigger than `max_bytes`
+        is closed and a new one is started, only `backups` closed
+        files are kept.
+        '''
+        self.directory: str = directory
+        self.max_bytes: int = max_bytes
+        self.backups: int = backups
+        self.interval: float = interval
+
+        self.buffer: bytearray = bytearray()
+        self.scheduled: bool = False
+        self.writes: Set[asyncio.Future] = set()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+        # only used on the background thread
+        self.file: BinaryIO = None
+        self.number: int = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+
+    def handle(self, batch: List[events.Event]):
+        '''
+        Event stream consumer.
+        '''
+        now = int(time.time())
+
+        for event in batch:
+            record = encode(event, now)
+            if record != None:
+                self.buffer += record
+
+        if len(self.buffer) > 0 and not self.scheduled:
+            self.scheduled = True
+            asyncio.get_running_loop().call_later(self.interval, self.flush)
+
+
+    def flush(self):
+        '''
+        Writes the collected records in the background.
+        '''
+        self.scheduled = False
+        if len(self.buffer) == 0: return
+
+        data = bytes(self.buffer)
+        self.buffer.clear()
+
+        write = asyncio.get_running_loop().run_in_executor(self.executor, self.write, data)
+        self.writes.add(write)
+        write.add_done_callback(self.writes.discard)
+
+
+    def write(self, data: bytes):
+        if self.file == None:
+            numbers = files(self.directory)
+            self.number = numbers[-1] if len(numbers) > 0 else 1
+            self.file = open(path_of(self.directory, self.number), 'ab')
+
+        self.file.write(data)
+        self.file.flush()
+
+        if self.file.tell() >= self.max_bytes:
+            self.rotate()
+
+
+    def rotate(self):
+        self.file.close()
+        self.number += 1
+        self.file = open(path_of(self.directory, self.number), 'ab')
+
+        for i in files(self.directory)[:-self.backups - 1]:
+            os.remove(path_of(self.directory, i))
+
+
+    async def close(self):
+        '''
+        Writes everything left and closes the file.
+        '''
+        self.flush()
+        if len(self.writes) > 0:
+            await asyncio.gather(*self.writes)
+
+        self.executor.shutdown()
+        if self.file != None:
+            self.file.close()
+
+
+# reading
+
+def path_of(directory: str, number: int) -> str:
+    return os.path.join(directory, f'events-{number:06d}.bin')
+
+
+def files(directory: str) -> List[int]:
+    '''
+    Returns the numbers of the log files, oldest first.
+    '''
+    numbers = []
+    for i in os.listdir(directory):
+        if i.startswith('events-') and i.endswith('.bin'):
+            numbers.append(int(i[7:-4]))
+
+    return sorted(numbers)
+
+
+def read(directory: str) -> Iterator[tuple]:
+    '''
+    Yields every record in the log, oldest first.
+    '''
+    for i in files(directory):
+        with open(path_of(directory, i), 'rb') as f:
+            data = f.read()
+
+        # a record cut off by a crash is skipped
+        yield from RECORD.iter_unpack(data[:len(data) - len(data) % RECORD.size])
+
+
+def games(records: Iterable[tuple]) -> Dict[int, List[List[tuple]]]:
+    '''
+    Groups the records by game. An author can play many games,
+    so every author has a list of games, each starting with a START.
+    '''
+    result: Dict[int, List[List[tuple]]] = {}
+
+    for i in records:
+        game, kind = i[1], i[2]
+
+        if kind == START:
+            result.setdefault(game, []).append([i])
+        elif game in result:
+            result[game][-1].append(i)
+
+    return result
+
+
+def replay(records: List[tuple], step: int = None) -> engine.Game:
+    '''
+    Rebuilds a game from its records, stopping after `step` actions.
+    '''
+    _, id, kind, other, seed = records[0]
+    if kind != START:
+        raise ValueError('the records don\'t start with a game')
+
+    game = engine.Game(lambda event: None, [(id, str(id)), (other, str(other))], 0, 0, seed)
+    game.ready_up()
+
+    for _, _, kind, player, arg in records[1:][:step]:
+        apply(game, kind, player, arg)
+
+    return game
+
+
+def apply(game: engine.Game, kind: int, player: int, arg: int):
+    if kind == ROUND:
+        game.new_round()
+
+    elif kind == CARD:
+        game.use_card(player, arg)
+
+    # taking and passing share a record, a player passes after taking
+    elif kind == TAKE:
+        if game.took:
+            game.pass_turn(player)
+        else:
+            game.take_card(player)
+
+    elif kind == SUIT:
+        game.answer_type_chooser(player, config.TYPES[arg])
+
+    elif kind == QUEEN:
+        game.queen_end(player)
+
+    elif kind == END:
+        game.end(REASONS[arg])
+
+
+def describe(record: tuple) -> str:
+    now, _, kind, player, arg = record
+    when = datetime.datetime.fromtimestamp(now).strftime('%Y-%m-%d %H:%M:%S')
+
+    if kind == CARD:
+        arg = str(engine.DECK[arg])
+    elif kind == SUIT:
+        arg = config.TYPES[arg]
+    elif kind == END:
+        arg = REASONS[arg]
+
+    return f'{when} {KINDS[kind]:<5} {player or ""} {arg or ""}'
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Replays games from the event log.')
+    parser.add_argument('directory')
+    parser.add_argument('game', type=int, nargs='?', help='author of the game, lists the games if not set')
+    parser.add_argument('--index', type=int, default=-1, help='which of the author\'s games, the last by default')
+    parser.add_argument('--step', type=int, default=None, help='actions to replay, all by default')
+    args = parser.parse_args()
+
+    logged = games(read(args.directory))
+
+    if args.game == None:
+        for id, i in logged.items():
+            for index, records in enumerate(i):
+                print(f'{id} #{index}: {describe(records[0])[:19]}, {len(records) - 1} actions')
+
+    else:
+        records = logged[args.game][args.index]
+        step = args.step if args.step != None else len(records) - 1
+
+        for index, i in enumerate(records[1:step + 1]):
+            print(f'{index + 1:>4} {describe(i)}')
+
+        game = replay(records, step)
+        print()
+        print(render.build(game))
+        for i in game.players.values():
+            print(f'{i.id}: {" ".join([str(j) for j in i.cards])}')
@@ -0,0 +1,83 @@
+'''
+Game events.
+'''
+from typing import *
+
+if TYPE_CHECKING:
+    from .engine import Card, Game
+
+
+class Event:
+    def __init__(self, game: "Game"):
+        '''
+        Something that happened in a game. Events are emitted
+        after the state has changed, so `game` is already updated.
+        '''
+        self.game: "Game" = game
+
+
+# the invite is sent, the game starts once it is accepted
+class GameCreated(Event): pass
+
+
+class GameStarted(Event): pass
+
+
+class RoundStarted(Event):
+    def __init__(self, game: "Game", number: int):
+        super().__init__(game)
+        self.number: int = number
+
+
+class CardPlayed(Event):
+    def __init__(self, game: "Game", player: int, card: "Card"):
+        super().__init__(game)
+        self.player: int = player
+        self.card: "Card" = card
+
+
+class SuitChosen(Event):
+    def __init__(self, game: "Game", player: int, suit: str):
+        super().__init__(game)
+        self.player: int = player
+        self.suit: str = suit
+
+
+class CardsDrawn(Event):
+    def __init__(self, game: "Game", player: int, count: int, penalty: bool = False):
+        '''
+        `penalty` is set when the cards were given by a six.
+        '''
+        super().__init__(game)
+        self.player: int = player
+        self.count: int = count
+        self.penalty: bool = penalty
+
+
+class TurnPassed(Event):
+    def __init__(self, game: "Game", player: int):
+        super().__init__(game)
+        self.player: int = player
+
+
+class QueenFlush(Event):
+    def __init__(self, game: "Game", player: int, amount: int):
+        super().__init__(game)
+        self.player: int = player
+        self.amount: int = amount
+
+
+class RoundEnded(Event):
+    def __init__(self, game: "Game", loser: int, points: int):
+        super().__init__(game)
+        self.loser: int = loser
+        self.points: int = points
+
+
+class GameOver(Event):
+    def __init__(self, game: "Game", reason: str):
+        '''
+        `reason` is 'points', 'left' or 'idle'.
+        '''
+        super().__init__(game)
+        self.reason: str = reason
@@ -0,0 +1,602 @@
+
+from typing import *
+
+from aiogram import types, Dispatcher, Bot, client, methods
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.filters.command import Command
+import asyncio
+from aiogram.utils.keyboard import InlineKeyboardBuilder
+
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+
+from . import ai
+from . import config
+from . import events
+from . import metrics
+from . import engine
+import random
+from . import routes
+from . import stream
+from .manager import Manager
+from .answers import Answers, Coalescer
+from .eventlog import EventLog
+from .stats import RedisStats, Stats
+from .outbox import Outbox
+from .render import Renderer
+from .session import Session, detach
+from .storage import Storage
+from .store import RedisStore
+from .webhook import WebhookServer
+
+# loading objects
+
+load_dotenv()
+TOKEN = os.getenv('TOKEN')
+DB_PATH = os.getenv('DB_PATH', 'shulpek.db')
+# player stats, other processes may write to the same file
+STATS_PATH = os.getenv('STATS_PATH', DB_PATH)
+EVENT_LOG = os.getenv('EVENT_LOG', 'logs')
+
+# 'polling' or 'webhook'
+MODE = os.getenv('MODE', 'polling')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL')
+WEBHOOK_PORT = int(os.getenv('WEBHOOK_PORT', '8080'))
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET')
+WEBHOOK_WORKERS = int(os.getenv('WEBHOOK_WORKERS', '16'))
+WEBHOOK_QUEUE = int(os.getenv('WEBHOOK_QUEUE', '1000'))
+AI_WORKERS = int(os.getenv('AI_WORKERS', '2'))
+
+# another Bot API server, e.g. a local one or the load test's fake one
+API_URL = os.getenv('API_URL')
+API_CONNECTIONS = int(os.getenv('API_CONNECTIONS', '100'))
+API_IN_FLIGHT = int(os.getenv('API_IN_FLIGHT', '100'))
+
+# local Prometheus endpoint, an empty port disables it
+METRICS_HOST = os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT = os.getenv('METRICS_PORT', '9100')
+
+# games shared by several instances, kept in this process if not set
+REDIS_URL = os.getenv('REDIS_URL')
+
+bot = Bot(TOKEN,
+    session=Session(
+        api=TelegramAPIServer.from_base(API_URL) if API_URL else PRODUCTION,
+        limit=API_CONNECTIONS,
+        in_flight=API_IN_FLIGHT
+    ),
+    default=client.default.DefaultBotProperties(
+        parse_mode='html'
+    )
+)
+bot.session.middleware(metrics.RequestMetrics())
+dp = Dispatcher()
+outbox = Outbox(bot)
+answers = Answers()
+renderer = Renderer()
+inline_queries = Coalescer()
+storage = Storage(DB_PATH)
+event_log = EventLog(EVENT_LOG)
+
+# the bot itself plays as the computer opponent
+ai_pool = ProcessPoolExecutor(AI_WORKERS, mp_context=multiprocessing.get_context('spawn'))
+thinking: Set[int] = set()
+tasks: Set[asyncio.Task] = set()
+
+mg = Manager(RedisStore.from_url(REDIS_URL) if REDIS_URL else None)
+
+# the totals of all instances are kept together
+if mg.store.shared:
+    stats = RedisStats(mg.store.client)
+else:
+    stats = Stats(STATS_PATH, shared=STATS_PATH != DB_PATH)
+
+metrics.registry.add(metrics.Gauge(
+    'shulpek_live_games', 'Started games.',
+    lambda: len([i for i in mg.games.values() if i.ready])
+))
+metrics.registry.add(metrics.Gauge(
+    'shulpek_pending_invites', 'Invites nobody answered yet.',
+    lambda: len([i for i in mg.games.values() if not i.ready])
+))
+
+
+# ---------------------------
+# functions
+# ---------------------------
+
+
+def send_state(game: engine.Game):
+    '''
+    Queues the game status message, merging it with a still queued one.
+    '''
+    def render():
+        if mg.get_game(game.id) is not game: return
+
+        start = time.perf_counter()
+        text = renderer.get(game)
+        metrics.RENDER_SECONDS.observe('state', time.perf_counter() - start)
+
+        return methods.SendMessage(
+            chat_id = game.chat,
+            text = text,
+            reply_to_message_id = game.message
+        )
+
+    def change(game: engine.Game, message: types.Message) -> bool:
+        # a later status message may be saved already
+        if game.over or message.message_id <= game.message: return False
+
+        game.message = message.message_id
+        storage.save(game)
+        return True
+
+    def done(message: types.Message):
+        # the game may have ended while the message was being sent
+        if mg.get_game(game.id) is not game: return
+
+        if mg.store.shared:
+            detach(mg.apply(game, lambda game: change(game, message)), tasks)
+        else:
+            change(game, message)
+
+    outbox.send(game.chat, render, done, key=game.id)
+
+
+async def ai_turn(game: engine.Game):
+    '''
+    Makes the computer's moves while it is its turn.
+    '''
+    id = game.id
+    if id in thinking: return
+    thinking.add(id)
+
+    try:
+        loop = asyncio.get_running_loop()
+
+        # another instance may replace the game between the moves
+        while (game := mg.get_game(id)) != None and game.can_act(bot.id):
+            action = await loop.run_in_executor(
+                ai_pool, ai.choose, game.to_dict(), bot.id, config.AI_BUDGET
+            )
+
+            if not await mg.apply(game, lambda game: game.act(bot.id, action)):
+                break
+
+    finally:
+        thinking.discard(id)
+
+
+def check_ai(game: engine.Game):
+    '''
+    Lets the computer move if it is its turn.
+    '''
+    if not game.can_act(bot.id) or game.id in thinking: return
+
+    task = asyncio.create_task(ai_turn(game))
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+
+
+def game_start(game: engine.Game):
+    keyboard = InlineKeyboardBuilder()
+    keyboard.add(types.InlineKeyboardButton(text='выбрать карту...', switch_inline_query_current_chat=''))
+
+    method = methods.EditMessageText(
+        text = 'игра началась!',
+        chat_id = game.chat,
+        message_id = game.message, 
+        reply_markup = keyboard.as_markup()
+    )
+    outbox.send(game.chat, lambda: method)
+
+
+def game_over(game: engine.Game, reason: str):
+    answers.forget(game)
+    renderer.forget(game)
+
+    if not game.ready:
+        method = methods.EditMessageText(
+            text = f'<b>приглашение истекло</b>' if reason == 'idle' else f'<b>а все</b>',
+            chat_id = game.chat,
+            message_id = game.message
+        )
+        outbox.send(game.chat, lambda: method)
+        return
+
+    score = ''
+    for i in game.players.values():
+        score += f'{i.mention}: <code>{i.pts}</code>\n'
+
+    title = 'игра закрыта, никто не ходил' if reason == 'idle' else 'конец игры'
+
+    # the last status message may still be queued
+    outbox.send(game.chat, lambda: methods.EditMessageText(
+        text = f'<b>{title}</b>\n\nсчёт:\n{score}',
+        chat_id = game.chat,
+        message_id = game.message
+    ))
+
+
+def update_chats(batch: List[events.Event]):
+    '''
+    Updates the game messages, every changed game is rendered once per batch.
+    '''
+    changed: Dict[int, engine.Game] = {}
+
+    for event in batch:
+        start = time.perf_counter()
+
+        if isinstance(event, events.GameStarted):
+            game_start(event.game)
+        elif isinstance(event, events.GameOver):
+            game_over(event.game, event.reason)
+        elif isinstance(event, events.GameCreated):
+            # the invite handler has sent the message already
+            pass
+        else:
+            changed[event.game.id] = event.game
+
+        metrics.EVENT_SECONDS.observe(type(event).__name__, time.perf_counter() - start)
+
+    for game in changed.values():
+        if mg.get_game(game.id) is not game: continue
+
+        send_state(game)
+        mg.watch(game)
+        check_ai(game)
+
+
+def persist(batch: List[events.Event]):
+    for event in batch:
+        if isinstance(event, events.GameOver):
+            storage.delete(event.game.id)
+        else:
+            storage.save(event.game)
+
+
+def count_events(batch: List[events.Event]):
+    for event in batch:
+        metrics.EVENTS.inc(type(event).__name__)
+
+
+# every consumer reads the game events at its own pace
+consumers = [
+    (mg.events.subscribe(), update_chats),
+    (mg.events.subscribe(), persist),
+    (mg.events.subscribe(), event_log.handle),
+    (mg.events.subscribe(), stats.handle),
+    (mg.events.subscribe(), count_events)
+]
+
+# ---------------------------
+# commands
+# ---------------------------
+
+@dp.message(Command('invite'))
+@metrics.timed(metrics.HANDLER_SECONDS, 'invite')
+async def invite(msg: types.Message):
+    '''
+    Invite a player to play.
+    '''
+    player1 = msg.from_user.id
+
+    if msg.reply_to_message is None:
+        await msg.reply('ответь на сообщение того, с кем хочешь поиграть!')
+        return
+
+    player2 = msg.reply_to_message.from_user.id
+
+    # filtering channel users and bots
+    if player1 == 136817688: # @Channel_Bot
+        await msg.reply(f'переключись на основной акк!')
+        return
+    
+    if player1 == 1087968824:
+        await msg.reply(f'убери анонимность админов в настройках группы!')
+        return
+    
+    if player2 == 136817688: # @Channel_Bot
+        await msg.reply(f'переключись на основной акк!')
+        return
+
+    if player2 == 1087968824:
+        await msg.reply(f'надо убрать анонимность админов в настройках группы!')
+        return
+
+    if msg.reply_to_message.from_user.is_bot and player2 != bot.id:
+        await msg.reply(f'с ботом играть нельзя!')
+        return
+
+    if player1 == player2:
+        await msg.reply(f'с самим собой играть нельзя!')
+        return
+
+    # checking chat type
+    if msg.chat.type == 'private':
+        await msg.reply('меня нужно использовать в группах!')
+        return
+
+    # checking if already playing, as the author or in another game
+    if await mg.fetch(player1) or await mg.fetch_playing(player1):
+        await msg.reply('ты уже играешь в игру!')
+        return
+
+    # playing against the computer
+    if player2 == bot.id:
+        message = await msg.reply('ну давай сыграем!')
+        game = await mg.new_game(
+            [(player1, msg.from_user.full_name), (player2, msg.reply_to_message.from_user.full_name)],
+            msg.chat.id, message.message_id
+        )
+        # another instance was faster
+        if game == None:
+            await message.edit_text('ты уже играешь в игру!')
+            return
+
+        await mg.ready_up(game)
+        return
+    
+    # keyboard
+    keyboard = InlineKeyboardBuilder()
+
+    keyboard.add(types.InlineKeyboardButton(
+        text='принять',
+        callback_data=f'accept:{player1}:{player2}'
+    ))
+    keyboard.add(types.InlineKeyboardButton(
+        text='отменить',
+        callback_data=f'deny:{player1}:{player2}'
+    ))
+        
+    user = msg.reply_to_message.from_user
+    mention = f'<a href="tg://user?id={user.id}">{user.full_name}</a>'
+    message = await msg.reply(
+        f'{mention}, тебя приглашают в игру в шульпека!\n\n'\
+        'прочитай правила, если не знаешь как играть - <b>/rules</b>',
+        reply_markup=keyboard.as_markup()
+    )
+    game = await mg.new_game(
+        [(player1, msg.from_user.full_name), (player2, msg.reply_to_message.from_user.full_name)],
+        msg.chat.id, message.message_id
+    )
+    if game == None:
+        await message.edit_text('ты уже играешь в игру!')
+        return
+
+    storage.save(game)
+    mg.watch(game)
+
+
+@dp.message(Command('rules'))
+async def rules(msg: types.Message):
+    '''
+    show game rules
+    '''
+    await msg.reply(mg.rules)
+
+
+@dp.message(Command('stats'))
+@metrics.timed(metrics.HANDLER_SECONDS, 'stats')
+async def show_stats(msg: types.Message):
+    '''
+    show the stats of a player.
+    '''
+    user = msg.from_user
+    if msg.reply_to_message != None:
+        user = msg.reply_to_message.from_user
+
+    row = stats.get(user.id)
+    mention = f'<a href="tg://user?id={user.id}">{user.full_name}</a>'
+
+    if row == None:
+        await msg.reply(f'{mention} ещё не играл!')
+        return
+
+    _, games, wins, rounds, flushes, points = row
+    await msg.reply(
+        f'<b>статистика</b> {mention}\n\n'\
+        f'игр: <code>{games}</code>, побед: <code>{wins}</code> '\
+        f'(<code>{wins / max(games, 1) * 100:.0f}%</code>)\n'\
+        f'выиграно раундов: <code>{rounds}</code>\n'\
+        f'списаний дамами: <code>{flushes}</code>\n'\
+        f'набрано очков: <code>{points}</code>'
+    )
+
+
+@dp.message(Command('top'))
+@metrics.timed(metrics.HANDLER_SECONDS, 'top')
+async def top(msg: types.Message):
+    '''
+    show the players with the most wins.
+    '''
+    leaders = stats.top()
+
+    if len(leaders) == 0:
+        await msg.reply('ещё никто не играл!')
+        return
+
+    lines = ''
+    for place, (id, (name, games, wins, *_)) in enumerate(leaders):
+        lines += f'{place + 1}. <a href="tg://user?id={id}">{name}</a> - '\
+            f'<code>{wins}</code> побед из <code>{games}</code>\n'
+
+    await msg.reply(f'<b>топ игроков</b>\n\n{lines}')
+
+
+@dp.message(Command('leave'))
+async def leave(msg: types.Message):
+    '''
+    leave an ongoing game.
+    '''
+    game = await mg.fetch_playing(msg.from_user.id)
+
+    # checking if not playing
+    if not game:
+        await msg.reply('ты не играешь!')
+        return
+    
+    await mg.end_game(game.id)
+
+    await msg.reply('вы вышли из игры!')
+
+
+# button answering
+
+async def accept(q: types.CallbackQuery, game: engine.Game, invited: int):
+    if q.from_user.id != invited:
+        detach(q.answer('❌ не для тебя моя кнопочка росла'), tasks)
+        return
+
+    # a user plays one game at a time
+    playing = await mg.fetch_playing(invited)
+    if playing != None and playing is not game:
+        detach(q.answer('❌ ты уже играешь в другой игре'), tasks)
+        return
+
+    # another instance may have started it meanwhile
+    if not await mg.ready_up(game):
+        detach(q.answer('❌ игра уже началась'), tasks)
+        return
+
+    detach(q.answer('✅ игра начата'), tasks)
+
+
+async def deny(q: types.CallbackQuery, game: engine.Game, invited: int):
+    if q.from_user.id not in [invited, game.id]:
+        detach(q.answer('❌ не для тебя моя кнопочка росла'), tasks)
+        return
+
+    await mg.end_game(game.id)
+    detach(q.answer('✅ игра отменена'), tasks)
+
+
+BUTTONS = {
+    'accept': metrics.timed(metrics.HANDLER_SECONDS, 'accept')(accept),
+    'deny': metrics.timed(metrics.HANDLER_SECONDS, 'deny')(deny)
+}
+
+
+@dp.callback_query()
+async def button(q: types.CallbackQuery):
+    data = routes.parse_callback(q.data)
+    if data == None:
+        detach(q.answer('❌ не знаю такую кнопку'), tasks)
+        return
+
+    kind, author, invited = data
+    game = await mg.fetch(author)
+
+    # an old invite of the same author points to another game
+    if game == None or invited not in game.players:
+        detach(q.answer('❌ не знаю такую игру'), tasks)
+        return
+
+    if game.ready:
+        detach(q.answer('❌ игра уже началась'), tasks)
+        return
+
+    await BUTTONS[kind](q, game, invited)
+
+
+# answering inline query
+
+@dp.chosen_inline_result()
+@metrics.timed(metrics.HANDLER_SECONDS, 'inline_result')
+async def inline_result(q: types.ChosenInlineResult):
+    action = routes.parse_result(q.result_id)
+    if action == None: return
+
+    game = await mg.fetch_playing(q.from_user.id)
+    if game == None: return
+
+    # ending game
+    if action == routes.CANCEL:
+        await mg.end_game(game.id)
+        return
+
+    await mg.apply(game, lambda game: game.act(q.from_user.id, action))
+
+
+
+# inline query
+
+async def answer_inline(q: types.InlineQuery):
+    game = await mg.fetch_playing(q.from_user.id)
+    await q.answer(answers.get(game, q.from_user.id), cache_time=1, is_personal=True)
+
+
+@dp.inline_query()
+@metrics.timed(metrics.HANDLER_SECONDS, 'inline')
+async def inline(q: types.InlineQuery):
+    # a user sends a query on every keystroke, only the latest one matters
+    await inline_queries.run(q.from_user.id, q, answer_inline)
+
+
+# starting bot
+
+metrics_server = None
+
+
+@dp.startup()
+async def restore():
+    '''
+    Restores the games saved before the restart.
+    '''
+    for queue, handler in consumers:
+        task = asyncio.create_task(stream.consume(queue, handler))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    await mg.start()
+    await stats.start()
+
+    # shared games are loaded when they are needed
+    if not mg.store.shared:
+        for i in storage.load():
+            game = mg.add_game(engine.Game.from_dict(mg.emit, i))
+            mg.watch(game)
+            check_ai(game)
+
+    print(f'Restored {len(mg.games)} games')
+
+    if METRICS_PORT:
+        global metrics_server
+        metrics_server = await metrics.serve(METRICS_HOST, int(METRICS_PORT))
+
+
+@dp.shutdown()
+async def close():
+    if metrics_server != None:
+        await metrics_server.cleanup()
+
+    ai_pool.shutdown(cancel_futures=True)
+    await storage.close()
+    await stats.close()
+    await mg.store.close()
+    await event_log.close()
+
+
+def run():
+    '''
+    Starts the bot, see `python -m shulpek`.
+    '''
+    if MODE == 'webhook':
+        server = WebhookServer(
+            dp, bot,
+            url=WEBHOOK_URL,
+            port=WEBHOOK_PORT,
+            secret=WEBHOOK_SECRET,
+            workers=WEBHOOK_WORKERS,
+            queue_size=WEBHOOK_QUEUE
+        )
+
+        print(f'Started webhook on port {WEBHOOK_PORT}...')
+        asyncio.run(server.run())
+
+    else:
+        print('Started polling...')
+        asyncio.run(dp.start_polling(bot))
\ No newline at end of file
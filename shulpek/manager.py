@@ -0,0 +1,301 @@
+'''
+Game manager, keeps the games and runs their timers.
+'''
+from typing import *
+
+import asyncio
+import functools
+import os
+import time
+
+from . import config
+from . import events
+from .engine import Game
+from .events import Event
+from .store import MemoryStore
+from .stream import EventStream
+from .timers import TimerWheel
+
+
+class Manager:
+    def __init__(self, store: Any = None):
+        '''
+        Represents a game manager.
+
+        `games` and `playing` hold the games this instance works with,
+        `store` decides where the games really live, see `store.py`.
+        '''
+        self.games: Dict[int, Game] = {}
+        self.playing: Dict[int, Game] = {}
+        self.store = store if store != None else MemoryStore()
+        self.locks: Dict[int, asyncio.Lock] = {}
+        self.timers: TimerWheel = TimerWheel()
+        self.events: EventStream = EventStream()
+
+
+    @functools.cached_property
+    def rules(self) -> str:
+        '''
+        Rules text, read from the package on first use.
+        '''
+        with open(os.path.join(os.path.dirname(__file__), 'rules.html'), 'r', encoding='utf-8') as f:
+            return f.read()
+
+
+    async def start(self):
+        '''
+        Starts dropping the games other instances change.
+        '''
+        await self.store.listen(self.remove_game)
+
+
+    def emit(self, event: Event):
+        '''
+        Receives the events of every game and publishes them.
+        A finished game is removed right away.
+        '''
+        if isinstance(event, events.GameOver):
+            self.remove_game(event.game.id)
+
+        self.events.publish(event)
+
+
+    def get_game_playing(self, id: int) -> Game:
+        '''
+        Returns the game the user is currently playing.
+        '''
+        return self.playing.get(id)
+
+
+    def get_game(self, id: int) -> Game:
+        '''
+        Returns a game by its author.
+        '''
+        if id not in self.games: return None
+
+        return self.games[id]
+
+
+    async def fetch(self, id: int) -> Game:
+        '''
+        Returns a game by its author, loading it from the store if needed.
+        '''
+        game = self.games.get(id)
+        if game != None or not self.store.shared:
+            return game
+
+        data = await self.store.load(id)
+        if data == None or id in self.games:
+            return self.games.get(id)
+
+        # the instance that had the timers may have dropped the game
+        game = self.add_game(Game.from_dict(self.emit, data))
+        self.watch(game)
+
+        return game
+
+
+    async def fetch_playing(self, id: int) -> Game:
+        '''
+        Returns the game the user is playing, loading it from the store if needed.
+        '''
+        game = self.playing.get(id)
+        if game != None or not self.store.shared:
+            return game
+
+        author = await self.store.find(id)
+        if author == None:
+            return None
+
+        game = await self.fetch(author)
+        if game == None or self.playing.get(id) is not game:
+            return None
+
+        return game
+    
+
+    async def new_game(self, players: List[int], chat:int, message:int) -> Game:
+        '''
+        Creates a new game, returns None if the author already has one.
+        '''
+        id = players[0][0]
+
+        game = Game(
+            self.emit,
+            players,
+            chat,
+            message
+        )
+
+        if not await self.store.save(game):
+            return None
+
+        await self.store.link(game, [game.id])
+        self.add_game(game)
+        self.emit(events.GameCreated(game))
+
+        return game
+
+
+    def add_game(self, game: Game) -> Game:
+        '''
+        Adds an existing game, e.g. a restored one.
+        '''
+        self.games[game.id] = game
+
+        # a user stays linked to the game they joined first
+        if game.ready:
+            for i in game.players:
+                self.playing.setdefault(i, game)
+        else:
+            # only the author is playing until the invite is accepted
+            self.playing.setdefault(game.id, game)
+
+        return game
+
+
+    async def apply(self, game: Game, change: Callable[[Game], Any], retries: int = 5) -> Any:
+        '''
+        Changes a game and saves it to the store, returns what `change` returns.
+
+        `change` returns whether it changed anything and must check
+        its own conditions, as it may run on a newer state than the
+        caller saw. If another instance changed the game meanwhile,
+        the change is made again on the new state. Events are only
+        published once the change is saved, so nothing is shown for
+        a lost change.
+        '''
+        if not self.store.shared:
+            return change(game)
+
+        lock = self.locks.setdefault(game.id, asyncio.Lock())
+
+        async with lock:
+            for _ in range(retries):
+                game = self.games.get(game.id) or await self.fetch(game.id)
+                if game == None: return None
+
+                emitted = []
+                game.emit = emitted.append
+                try:
+                    result = change(game)
+                finally:
+                    game.emit = self.emit
+
+                # a rejected change has nothing to save
+                if not result:
+                    return result
+
+                if await self.store.save(game):
+                    for i in emitted:
+                        self.emit(i)
+
+                    if game.over:
+                        await self.store.delete(game)
+                    else:
+                        # the save drops the game and its timers on the other instances
+                        self.watch(game)
+
+                    return result
+
+                # the cached copy is outdated
+                self.remove_game(game.id)
+
+        return None
+
+
+    async def ready_up(self, game: Game) -> bool:
+        '''
+        Starts a game once the opponent accepts it,
+        returns False if it was started already.
+        '''
+        def change(game: Game):
+            if not game.ready_up(): return False
+
+            for i in game.players:
+                self.playing.setdefault(i, game)
+
+            return True
+
+        if not await self.apply(game, change):
+            return False
+
+        await self.store.link(game, game.players)
+        return True
+
+
+    def idle_limit(self, game: Game) -> float:
+        '''
+        Returns how long the game may stay idle in its current phase.
+        '''
+        if not game.ready:
+            return config.IDLE_LIMITS['invite']
+
+        if game.waiting:
+            return config.IDLE_LIMITS['waiting']
+
+        return config.IDLE_LIMITS['playing']
+
+
+    def idle(self, game: Game) -> bool:
+        return game.active + self.idle_limit(game) <= time.monotonic()
+
+
+    def watch(self, game: Game):
+        '''
+        Schedules the game's eviction for when it would become idle,
+        and the next round during a round break.
+        '''
+        delay = game.active + self.idle_limit(game) - time.monotonic()
+        self.timers.schedule(game.id, 'idle', delay, lambda: self.expire(game))
+
+        if not (game.ready and game.waiting):
+            self.timers.cancel(game.id, 'round')
+
+        # a running round timer isn't moved by the changes made in the break
+        elif (game.id, 'round') not in self.timers.timers:
+            self.timers.schedule(game.id, 'round', config.ROUND_DELAY, lambda: self.apply(game, Game.new_round))
+
+
+    async def expire(self, game: Game):
+        '''
+        Ends the game if nothing happened in it since it was watched.
+        '''
+        if self.games.get(game.id) is not game: return
+
+        # an action since the timer was scheduled moves the deadline
+        if not self.idle(game):
+            self.watch(game)
+            return
+
+        await self.apply(game, lambda game: self.idle(game) and game.end('idle'))
+
+
+    def remove_game(self, id: int) -> Game:
+        '''
+        Removes a game and unlinks its players.
+        '''
+        game = self.games.pop(id, None)
+        if game == None: return None
+
+        self.timers.cancel(id)
+        lock = self.locks.get(id)
+        if lock != None and not lock.locked():
+            self.locks.pop(id)
+
+        for i in game.players:
+            if self.playing.get(i) is game:
+                self.playing.pop(i)
+
+        return game
+
+
+    async def end_game(self, id: int, reason: str = 'left') -> bool:
+        '''
+        Ends a game.
+        '''
+        game = await self.fetch(id)
+        if game == None: return False
+
+        await self.apply(game, lambda game: game.end(reason))
+        return True
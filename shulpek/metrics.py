@@ -0,0 +1,184 @@
+'''
+Lightweight metrics exposed in the Prometheus text format.
+'''
+from typing import *
+
+import bisect
+import functools
+import time
+
+from aiohttp import web
+from aiogram import Bot
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods.base import TelegramMethod
+
+
+BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, label: str, buckets: List[float] = BUCKETS):
+        '''
+        Counts observed durations in buckets, separately for each label value.
+        '''
+        self.name: str = name
+        self.help: str = help
+        self.label: str = label
+        self.buckets: List[float] = buckets
+
+        # label value -> [counts per bucket + overflow, sum]
+        self.values: Dict[str, list] = {}
+
+
+    def observe(self, label: str, value: float):
+        data = self.values.get(label)
+        if data == None:
+            data = self.values[label] = [[0] * (len(self.buckets) + 1), 0.0]
+
+        data[0][bisect.bisect_left(self.buckets, value)] += 1
+        data[1] += value
+
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} histogram']
+
+        for label, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ['+Inf'], counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{self.label}="{label}",le="{bound}"}} {cumulative}')
+
+            lines.append(f'{self.name}_sum{{{self.label}="{label}"}} {total}')
+            lines.append(f'{self.name}_count{{{self.label}="{label}"}} {cumulative}')
+
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, help: str, label: str):
+        '''
+        Counts events, separately for each label value.
+        '''
+        self.name: str = name
+        self.help: str = help
+        self.label: str = label
+        self.values: Dict[str, int] = {}
+
+
+    def inc(self, label: str, amount: int = 1):
+        self.values[label] = self.values.get(label, 0) + amount
+
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} counter']
+
+        for label, value in self.values.items():
+            lines.append(f'{self.name}{{{self.label}="{label}"}} {value}')
+
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help: str, get: Callable[[], float]):
+        '''
+        A value read when the metrics are scraped.
+        '''
+        self.name: str = name
+        self.help: str = help
+        self.get: Callable[[], float] = get
+
+
+    def render(self) -> List[str]:
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} gauge', f'{self.name} {self.get()}']
+
+
+class Registry:
+    def __init__(self):
+        self.metrics: list = []
+
+
+    def add(self, metric: Any) -> Any:
+        self.metrics.append(metric)
+        return metric
+
+
+    def render(self) -> str:
+        lines = []
+        for i in self.metrics:
+            lines.extend(i.render())
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+HANDLER_SECONDS = registry.add(Histogram('shulpek_handler_seconds', 'Time spent in update handlers.', 'handler'))
+EVENT_SECONDS = registry.add(Histogram('shulpek_event_seconds', 'Time spent handling game events.', 'event'))
+EVENTS = registry.add(Counter('shulpek_events_total', 'Game events emitted by the engine.', 'event'))
+RENDER_SECONDS = registry.add(Histogram('shulpek_render_seconds', 'Time spent rendering messages.', 'message'))
+API_SECONDS = registry.add(Histogram('shulpek_api_seconds', 'Bot API call duration.', 'method'))
+API_ERRORS = registry.add(Counter('shulpek_api_errors_total', 'Failed Bot API calls.', 'method'))
+RETRY_AFTER = registry.add(Counter('shulpek_api_retry_after_total', 'Bot API calls answered with 429.', 'method'))
+
+
+def timed(histogram: Histogram, label: str) -> Callable:
+    '''
+    Observes the duration of an async function.
+    '''
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(label, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+class RequestMetrics(BaseRequestMiddleware):
+    '''
+    Times every Bot API call and counts the failed ones.
+    '''
+    async def __call__(self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod
+    ):
+        name = type(method).__name__
+        start = time.perf_counter()
+
+        try:
+            return await make_request(bot, method)
+
+        except TelegramRetryAfter:
+            RETRY_AFTER.inc(name)
+            raise
+
+        except Exception:
+            API_ERRORS.inc(name)
+            raise
+
+        finally:
+            API_SECONDS.observe(name, time.perf_counter() - start)
+
+
+async def serve(host: str, port: int) -> web.AppRunner:
+    '''
+    Starts the HTTP server exposing /metrics.
+    '''
+    async def handle(request: web.Request) -> web.Response:
+        return web.Response(text=registry.render(), content_type='text/plain')
+
+    app = web.Application()
+    app.router.add_get('/metrics', handle)
+
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host, port).start()
+
+    return runner
@@ -0,0 +1,153 @@
+'''
+Outgoing message queue with Telegram flood limits.
+'''
+from typing import *
+
+import asyncio
+import logging
+from collections import deque
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramRetryAfter
+from aiogram.methods.base import TelegramMethod
+
+
+class Entry:
+    def __init__(self,
+        key: Optional[Hashable],
+        render: Callable[[], Optional[TelegramMethod]],
+        done: Optional[Callable]
+    ):
+        '''
+        Represents a queued message.
+        '''
+        self.key = key
+        self.render = render
+        self.done = done
+
+
+class Outbox:
+    def __init__(self,
+        bot: Bot,
+        chat_interval: float = 3.0,
+        global_rate: float = 30.0,
+        retries: int = 5,
+        backoff: float = 1.0
+    ):
+        '''
+        Sends API calls through per-chat queues.
+
+        Telegram allows about 20 messages a minute in a group, where
+        the bot is played, and 30 messages per second overall.
+        '''
+        self.bot: Bot = bot
+        self.chat_interval: float = chat_interval
+        self.global_interval: float = 1 / global_rate
+        self.retries: int = retries
+        self.backoff: float = backoff
+
+        self.queues: Dict[int, Deque[Entry]] = {}
+        self.workers: Dict[int, asyncio.Task] = {}
+        self.next_send: Dict[int, float] = {}
+        self.global_next: float = 0.0
+
+
+    def send(self,
+        chat: int,
+        render: Callable[[], Optional[TelegramMethod]],
+        done: Optional[Callable] = None,
+        key: Optional[Hashable] = None
+    ):
+        '''
+        Queues a call to the chat.
+
+        `render` builds the method right before sending, returning None skips it.
+        A call with the same `key` as the last queued one replaces it.
+        '''
+        queue = self.queues.setdefault(chat, deque())
+
+        if key != None and len(queue) > 0 and queue[-1].key == key:
+            queue[-1].render = render
+            queue[-1].done = done
+            return
+
+        queue.append(Entry(key, render, done))
+
+        if chat not in self.workers:
+            self.workers[chat] = asyncio.create_task(self.worker(chat))
+
+
+    async def wait_slot(self, chat: int):
+        '''
+        Waits until the chat and global budgets allow another call.
+        '''
+        now = asyncio.get_running_loop().time()
+        slot = max(now, self.next_send.get(chat, 0.0), self.global_next)
+
+        self.global_next = slot + self.global_interval
+        self.next_send[chat] = slot + self.chat_interval
+
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+    async def call(self, chat: int, method: TelegramMethod) -> Any:
+        '''
+        Calls the method, retrying when Telegram asks to slow down.
+        '''
+        delay = self.backoff
+
+        for _ in range(self.retries):
+            try:
+                return await self.bot(method)
+
+            except TelegramRetryAfter as e:
+                wait = max(e.retry_after, delay)
+                delay *= 2
+
+                now = asyncio.get_running_loop().time()
+                self.next_send[chat] = now + wait
+                await asyncio.sleep(wait)
+
+        logging.warning(f'dropped {type(method).__name__} to {chat} after {self.retries} retries')
+        return None
+
+
+    async def worker(self, chat: int):
+        '''
+        Sends everything queued to the chat.
+        '''
+        queue = self.queues[chat]
+        loop = asyncio.get_running_loop()
+
+        try:
+            while True:
+                if len(queue) == 0:
+                    # the chat's spacing is only forgotten once its slot has passed
+                    rest = self.next_send.get(chat, 0.0) - loop.time()
+                    if rest <= 0: break
+
+                    await asyncio.sleep(rest)
+                    continue
+
+                # waiting first so updates can still be merged
+                await self.wait_slot(chat)
+
+                entry = queue.popleft()
+                method = entry.render()
+                if method == None: continue
+
+                try:
+                    result = await self.call(chat, method)
+                except Exception:
+                    logging.exception(f'failed to send {type(method).__name__} to {chat}')
+                    continue
+
+                if result != None and entry.done != None:
+                    entry.done(result)
+
+        finally:
+            self.workers.pop(chat, None)
+            if len(queue) == 0:
+                self.queues.pop(chat, None)
+                self.next_send.pop(chat, None)
@@ -0,0 +1,109 @@
+'''
+Game status message, rendered from cached pieces.
+'''
+from typing import *
+
+from . import config
+from . import engine
+
+
+# templates
+
+ROUND_END = (
+    '<b>конец раунда {round}</b>\n\n{loser} проиграл!'
+    '\n\n{earned}\n\nслед. раунд через {delay} секунд'
+).format
+TYPE_CHOOSER = '{mention}, выбери масть!'.format
+PLAYER = '{marker}{mention}\n<code>   </code>📊 <code>{pts}</code>  -  🃏 <code>{count}</code>\n\n'.format
+DECK = 'карт в колоде: <code>{count}</code>\n'.format
+
+MARKERS = ['<code>   </code>', '👉 ']
+STACKS = ['карта: ' + str(i) for i in engine.DECK]
+SUITS = {i: ' → ' + i for i in config.TYPES}
+
+
+def build(game: engine.Game, player: Callable[[engine.Game, engine.Player], str] = None) -> str:
+    '''
+    Renders the message, `player` renders the lines of a player.
+    '''
+    if game.waiting:
+        return ROUND_END(
+            round=game.round,
+            loser=game.players[game.loser].mention,
+            earned=game.loser_earned,
+            delay=config.ROUND_DELAY
+        )
+
+    if game.type_chooser:
+        return TYPE_CHOOSER(mention=game.players[game.turn].mention)
+
+    if player == None:
+        player = fragment
+
+    parts = [player(game, i) for i in game.players.values()]
+    parts.append(DECK(count=len(game.deck)))
+
+    if game.stack != None:
+        parts.append(STACKS[game.stack.index])
+    if game.suit != None:
+        parts.append(SUITS[game.suit])
+
+    return ''.join(parts)
+
+
+def fragment(game: engine.Game, player: engine.Player) -> str:
+    return PLAYER(
+        marker=MARKERS[player.id == game.turn],
+        mention=player.mention,
+        pts=player.pts,
+        count=player.count
+    )
+
+
+class Renderer:
+    def __init__(self):
+        '''
+        Caches the message of every game until its state changes,
+        and the lines of every player until their points, cards
+        or turn change.
+        '''
+        # game id -> (game, version, text)
+        self.messages: Dict[int, Tuple[engine.Game, int, str]] = {}
+        # user -> (player, key, text)
+        self.fragments: Dict[int, Tuple[engine.Player, tuple, str]] = {}
+
+
+    def get(self, game: engine.Game) -> str:
+        cached = self.messages.get(game.id)
+        if cached != None and cached[0] is game and cached[1] == game.version:
+            return cached[2]
+
+        text = build(game, self.fragment)
+        self.messages[game.id] = (game, game.version, text)
+
+        return text
+
+
+    def fragment(self, game: engine.Game, player: engine.Player) -> str:
+        key = (player.id == game.turn, player.pts, player.hand)
+
+        cached = self.fragments.get(player.id)
+        if cached != None and cached[0] is player and cached[1] == key:
+            return cached[2]
+
+        text = fragment(game, player)
+        self.fragments[player.id] = (player, key, text)
+
+        return text
+
+
+    def forget(self, game: engine.Game):
+        '''
+        Drops the cached pieces of a finished game.
+        '''
+        if game.id in self.messages and self.messages[game.id][0] is game:
+            self.messages.pop(game.id)
+
+        for id, player in game.players.items():
+            if id in self.fragments and self.fragments[id][0] is player:
+                self.fragments.pop(id)
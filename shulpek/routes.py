@@ -0,0 +1,87 @@
+'''
+Parsing of inline result ids and callback data.
+
+Payloads are parsed once into the actions `Game.act` takes,
+anything malformed is rejected before it reaches the game.
+'''
+from typing import *
+
+from . import config
+from . import engine
+
+
+CANCEL = ('cancel',)
+TAKE = ('take',)
+PASS = ('pass',)
+QUEEN = ('queen',)
+
+
+def card(arg: str) -> Optional[tuple]:
+    # the index of the card in the deck
+    if not arg.isascii() or not arg.isdigit() or int(arg) >= len(engine.DECK):
+        return None
+
+    return ('card', int(arg))
+
+
+def suit(arg: str) -> Optional[tuple]:
+    if arg not in config.TYPES:
+        return None
+
+    return ('suit', arg)
+
+
+def fixed(action: tuple) -> Callable[[str], Optional[tuple]]:
+    return lambda arg: action if arg == '' else None
+
+
+# result id prefix -> parser of the rest
+RESULTS: Dict[str, Callable[[str], Optional[tuple]]] = {
+    'card': card,
+    'typec': suit,
+    'take': fixed(TAKE),
+    'pass': fixed(PASS),
+    'queen': fixed(QUEEN),
+    'cancel': fixed(CANCEL)
+}
+
+CALLBACKS: Set[str] = {'accept', 'deny'}
+
+
+def parse_result(id: str) -> Optional[tuple]:
+    '''
+    Returns the action of a chosen inline result, or None for
+    the results that do nothing, e.g. 'discard'.
+    '''
+    kind, _, arg = id.partition(':')
+
+    parser = RESULTS.get(kind)
+    if parser == None:
+        return None
+
+    return parser(arg)
+
+
+def user_id(arg: str) -> Optional[int]:
+    if not arg.isascii() or not arg.isdigit() or len(arg) > 19:
+        return None
+
+    return int(arg)
+
+
+def parse_callback(data: Optional[str]) -> Optional[Tuple[str, int, int]]:
+    '''
+    Parses 'accept:author:invited' or 'deny:author:invited'.
+    '''
+    if data == None:
+        return None
+
+    parts = data.split(':')
+    if len(parts) != 3 or parts[0] not in CALLBACKS:
+        return None
+
+    author, invited = user_id(parts[1]), user_id(parts[2])
+    if author == None or invited == None:
+        return None
+
+    return (parts[0], author, invited)
@@ -0,0 +1,139 @@
+'''
+Bot API session with bounded concurrency, per-method timeouts
+and a circuit breaker.
+'''
+from typing import *
+
+import asyncio
+import logging
+import time
+
+from aiogram import Bot
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import PRODUCTION, TelegramAPIServer
+from aiogram.exceptions import TelegramNetworkError, TelegramServerError
+from aiogram.methods import GetUpdates
+from aiogram.methods.base import TelegramMethod
+
+from . import config
+
+
+class CircuitBreaker:
+    def __init__(self, failures: int = 5, cooldown: float = 10.0):
+        '''
+        Opens after `failures` failed calls in a row and lets calls
+        fail right away for `cooldown` seconds. Then a single call is
+        let through, its result closes or opens the breaker again.
+        '''
+        self.failures: int = failures
+        self.cooldown: float = cooldown
+
+        self.failed: int = 0
+        self.opened: float = None
+        self.probing: bool = False
+
+
+    def allow(self) -> bool:
+        if self.opened == None:
+            return True
+
+        if self.probing or time.monotonic() - self.opened < self.cooldown:
+            return False
+
+        self.probing = True
+        return True
+
+
+    def success(self):
+        self.failed = 0
+        self.opened = None
+        self.probing = False
+
+
+    def failure(self):
+        self.failed += 1
+        self.probing = False
+
+        if self.failed >= self.failures:
+            if self.opened == None:
+                logging.warning('Bot API is failing, pausing the calls')
+            self.opened = time.monotonic()
+
+
+class Session(AiohttpSession):
+    def __init__(self,
+        api: TelegramAPIServer = PRODUCTION,
+        limit: int = 100,
+        in_flight: int = 100,
+        timeouts: Dict[str, float] = config.API_TIMEOUTS,
+        keepalive: float = 60.0,
+        breaker: CircuitBreaker = None,
+        **kwargs
+    ):
+        '''
+        Keeps up to `limit` connections alive for `keepalive` seconds
+        and sends at most `in_flight` calls at once.
+
+        Long polling doesn't count against the limit and the breaker,
+        it waits on purpose and aiogram retries it by itself.
+        '''
+        super().__init__(api=api, limit=limit, **kwargs)
+        self._connector_init['keepalive_timeout'] = keepalive
+
+        self.in_flight: asyncio.Semaphore = asyncio.Semaphore(in_flight)
+        self.timeouts: Dict[str, float] = timeouts
+        self.breaker: CircuitBreaker = breaker if breaker != None else CircuitBreaker()
+
+
+    async def make_request(self,
+        bot: Bot,
+        method: TelegramMethod,
+        timeout: int = None
+    ) -> Any:
+        if isinstance(method, GetUpdates):
+            return await super().make_request(bot, method, timeout)
+
+        if not self.breaker.allow():
+            raise TelegramNetworkError(method=method, message='Circuit breaker is open')
+        probe = self.breaker.probing
+
+        if timeout == None:
+            timeout = self.timeouts.get(type(method).__name__)
+
+        try:
+            async with self.in_flight:
+                result = await super().make_request(bot, method, timeout)
+
+        except (TelegramNetworkError, TelegramServerError):
+            self.breaker.failure()
+            raise
+
+        except Exception:
+            # the API answered, so it works
+            self.breaker.success()
+            raise
+
+        except BaseException:
+            # a cancelled probe tells nothing, the next call probes again
+            if probe:
+                self.breaker.probing = False
+            raise
+
+        self.breaker.success()
+        return result
+
+
+def detach(call: Awaitable, tasks: Set[asyncio.Task]):
+    '''
+    Sends a call without waiting for it, for results nobody needs.
+    '''
+    # bot methods are awaitable but aren't coroutines
+    task = asyncio.ensure_future(call)
+    tasks.add(task)
+    task.add_done_callback(tasks.discard)
+    task.add_done_callback(failed)
+
+
+def failed(task: asyncio.Task):
+    if not task.cancelled() and task.exception() != None:
+        logging.warning(f'detached call failed: {task.exception()}')
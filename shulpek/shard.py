@@ -0,0 +1,357 @@
+'''
+Sharded mode: one front process receiving updates and several
+worker processes, each running the bot with its own games.
+
+Run with `python -m shulpek.shard`, the amount of workers is set by `SHARDS`.
+Updates are routed by chat id, so the amount of workers must stay
+the same between restarts for the saved games to be found. A user
+plays on one shard at a time.
+'''
+from typing import *
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import sqlite3
+from queue import Empty
+
+from aiogram import Bot, Dispatcher, types
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+from dotenv import load_dotenv
+
+from . import events
+from . import routes
+from .session import detach
+
+
+class Router:
+    def __init__(self, shards: int, path: str = None):
+        '''
+        Chooses the shard for an update.
+
+        Messages and buttons carry a chat, inline queries don't,
+        so they go to the shard where the user plays. Only the
+        workers know that, they report it with `acknowledge`, and
+        the map is kept in the SQLite database at `path`.
+        '''
+        self.shards: int = shards
+        self.users: Dict[int, int] = {}
+        self.db: sqlite3.Connection = None
+
+        if path != None:
+            self.db = sqlite3.connect(path)
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.db.execute('CREATE TABLE IF NOT EXISTS users (id INTEGER PRIMARY KEY, shard INTEGER NOT NULL)')
+
+            # shards beyond the current amount are gone
+            self.users = {
+                user: shard for user, shard in self.db.execute('SELECT id, shard FROM users')
+                if shard < shards
+            }
+
+
+    def shard_of(self, chat: int) -> int:
+        return chat % self.shards
+
+
+    def user_shard(self, user: int) -> int:
+        if user in self.users:
+            return self.users[user]
+
+        return self.shard_of(user)
+
+
+    def elsewhere(self, user: int, shard: int) -> bool:
+        '''
+        Whether the user plays on another shard than `shard`.
+        '''
+        return self.users.get(user, shard) != shard
+
+
+    def route(self, update: dict) -> Optional[int]:
+        '''
+        Returns the shard index for a raw update, or None if the
+        user tries to join a game while playing on another shard.
+        '''
+        if 'message' in update:
+            msg = update['message']
+            user = msg.get('from', {}).get('id')
+            text = msg.get('text', '')
+
+            # leaving works from any chat
+            if text.startswith('/leave'):
+                return self.user_shard(user)
+
+            shard = self.shard_of(msg['chat']['id'])
+
+            if text.startswith('/invite') and self.elsewhere(user, shard):
+                return None
+
+            return shard
+
+        if 'callback_query' in update:
+            q = update['callback_query']
+            user = q['from']['id']
+
+            if 'message' not in q:
+                return self.user_shard(user)
+
+            shard = self.shard_of(q['message']['chat']['id'])
+            data = routes.parse_callback(q.get('data'))
+
+            # the invited player joins the game by accepting
+            if data != None and data[0] == 'accept' and data[2] == user and self.elsewhere(user, shard):
+                return None
+
+            return shard
+
+        for i in ['inline_query', 'chosen_inline_result']:
+            if i in update:
+                return self.user_shard(update[i]['from']['id'])
+
+        return 0
+
+
+    def acknowledge(self, shard: int, reset: bool, changes: List[Tuple[int, bool]]):
+        '''
+        Applies what a worker reported: whether every user in `changes`
+        plays on it. `reset` drops the users it reported before.
+        '''
+        removed = []
+        if reset:
+            removed = [user for user, i in self.users.items() if i == shard]
+
+        for user in removed:
+            self.users.pop(user)
+
+        added = []
+        for user, playing in changes:
+            if playing:
+                self.users[user] = shard
+                added.append((user, shard))
+
+            # the user may have moved to another shard already
+            elif self.users.get(user) == shard:
+                self.users.pop(user)
+                removed.append(user)
+
+        if self.db == None: return
+
+        with self.db:
+            self.db.executemany('DELETE FROM users WHERE id = ?', [(i,) for i in removed])
+            self.db.executemany('INSERT OR REPLACE INTO users (id, shard) VALUES (?, ?)', added)
+
+
+    def close(self):
+        if self.db != None:
+            self.db.close()
+
+
+class Shards:
+    def __init__(self, count: int, target: Callable, *args, path: str = None):
+        '''
+        Runs `target(index, queue, acks, *args)` in `count` processes
+        and sends updates to them through queues. The workers put
+        `(index, reset, changes)` into `acks` for `Router.acknowledge`.
+        '''
+        context = multiprocessing.get_context('spawn')
+
+        self.router: Router = Router(count, path)
+        self.queues = [context.Queue() for _ in range(count)]
+        self.acks = context.Queue()
+        # not daemons, so a worker can start the computer opponent's processes
+        self.processes = [
+            context.Process(target=target, args=(i, self.queues[i], self.acks, *args))
+            for i in range(count)
+        ]
+
+
+    def start(self):
+        for i in self.processes:
+            i.start()
+
+
+    def send(self, update: dict) -> bool:
+        '''
+        Routes an update, returns False if it was refused.
+        '''
+        shard = self.router.route(update)
+        if shard == None:
+            return False
+
+        self.queues[shard].put(update)
+        return True
+
+
+    def receive(self, timeout: float = 1.0) -> List[tuple]:
+        '''
+        Waits for acknowledgements and returns every one already sent.
+        '''
+        try:
+            batch = [self.acks.get(timeout=timeout)]
+        except Empty:
+            return []
+
+        while not self.acks.empty():
+            batch.append(self.acks.get())
+
+        return batch
+
+
+    def stop(self, timeout: float = 30.0):
+        '''
+        Lets the workers finish their queues and waits for them,
+        a worker still running after `timeout` seconds is terminated.
+        '''
+        for i in self.queues:
+            i.put(None)
+
+        for i in self.processes:
+            i.join(timeout)
+
+            if i.is_alive():
+                logging.warning(f'shard worker {i.pid} did not stop, terminating it')
+                i.terminate()
+                i.join()
+
+        self.router.close()
+
+
+# worker
+
+async def serve(dp: Dispatcher, bot: Bot, queue: multiprocessing.Queue):
+    '''
+    Feeds updates from the queue to the dispatcher until None is received.
+    '''
+    loop = asyncio.get_running_loop()
+    tasks: Set[asyncio.Task] = set()
+
+    workflow_data = {'dispatcher': dp, 'bots': [bot], **dp.workflow_data}
+    await dp.emit_startup(bot=bot, **workflow_data)
+
+    try:
+        while True:
+            data = await loop.run_in_executor(None, queue.get)
+            if data == None: break
+
+            update = types.Update.model_validate(data, context={'bot': bot})
+            task = asyncio.create_task(dp.feed_update(bot, update))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+        if len(tasks) > 0:
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    finally:
+        await dp.emit_shutdown(bot=bot, **workflow_data)
+        await bot.session.close()
+
+
+def bot_worker(index: int, queue: multiprocessing.Queue, acks: multiprocessing.Queue):
+    '''
+    Runs the bot in a worker process with its own database,
+    event log and metrics port, the stats are shared by all workers.
+    '''
+    os.environ.setdefault('STATS_PATH', os.getenv('DB_PATH', 'shulpek.db'))
+    root, ext = os.path.splitext(os.getenv('DB_PATH', 'shulpek.db'))
+    os.environ['DB_PATH'] = f'{root}-{index}{ext}'
+    os.environ['EVENT_LOG'] = f'{os.getenv("EVENT_LOG", "logs")}-{index}'
+
+    port = os.getenv('METRICS_PORT', '9100')
+    if port:
+        os.environ['METRICS_PORT'] = str(int(port) + index)
+
+    from . import main
+
+    def report(batch: List[events.Event]):
+        '''
+        Tells the front who joined or left a game on this shard.
+        '''
+        users = set()
+        for event in batch:
+            if isinstance(event, (events.GameCreated, events.GameStarted, events.GameOver)):
+                users.update(event.game.players)
+
+        if len(users) > 0:
+            acks.put((index, False, [(i, i in main.mg.playing) for i in users]))
+
+    async def restored():
+        acks.put((index, True, [(i, True) for i in main.mg.playing]))
+
+    # registered after `main.restore`, so the restored games are reported
+    main.consumers.append((main.mg.events.subscribe(), report))
+    main.dp.startup.register(restored)
+
+    asyncio.run(serve(main.dp, main.bot, queue))
+
+
+# front
+
+async def front(token: str, shards: Shards, api: str = None):
+    '''
+    Long polls the updates and routes them to the workers.
+    '''
+    bot = Bot(token, session=AiohttpSession(api=TelegramAPIServer.from_base(api)) if api else None)
+    offset = None
+    tasks: Set[asyncio.Task] = set()
+
+    listener = asyncio.create_task(acknowledge(shards))
+
+    try:
+        while True:
+            try:
+                updates = await bot.get_updates(offset=offset, timeout=30)
+            except Exception:
+                logging.exception('failed to get updates')
+                await asyncio.sleep(1)
+                continue
+
+            for i in updates:
+                offset = i.update_id + 1
+
+                if not shards.send(i.model_dump(mode='json', by_alias=True, exclude_none=True)):
+                    detach(refuse(i), tasks)
+
+    finally:
+        listener.cancel()
+        await bot.session.close()
+
+
+async def acknowledge(shards: Shards):
+    '''
+    Keeps the user map up to date with what the workers report.
+    '''
+    loop = asyncio.get_running_loop()
+
+    while True:
+        for i in await loop.run_in_executor(None, shards.receive):
+            shards.router.acknowledge(*i)
+
+
+async def refuse(update: types.Update):
+    '''
+    Answers a user who tries to join a game while playing on another shard.
+    '''
+    if update.message != None:
+        await update.message.reply('ты уже играешь в игру!')
+    elif update.callback_query != None:
+        await update.callback_query.answer('❌ ты уже играешь в другой игре')
+
+
+if __name__ == '__main__':
+    load_dotenv()
+    count = int(os.getenv('SHARDS', '2'))
+
+    # the user map is kept next to the workers' databases
+    root, ext = os.path.splitext(os.getenv('DB_PATH', 'shulpek.db'))
+
+    shards = Shards(count, bot_worker, path=f'{root}-users{ext}')
+    shards.start()
+
+    print(f'Started polling with {count} shards...')
+    try:
+        asyncio.run(front(os.getenv('TOKEN'), shards, os.getenv('API_URL')))
+    finally:
+        shards.stop()
@@ -0,0 +1,182 @@
+'''
+Headless self-play simulator for the engine.
+
+    python -m shulpek.sim -n 100000 -j 8 --policy greedy
+'''
+from typing import *
+
+import random
+import time
+
+from . import config
+from . import engine
+from . import events
+
+
+# policies
+# a policy returns one of ('card', index), ('take',), ('pass',), ('queen',), ('suit', type)
+
+Policy = Callable[[engine.Game, int, random.Random], tuple]
+
+
+def take(game: engine.Game) -> tuple:
+    '''
+    Returns the move of a player who can't or doesn't want to drop a card.
+    '''
+    return ('pass',) if game.took else ('take',)
+
+
+def random_policy(game: engine.Game, id: int, rng: random.Random) -> tuple:
+    '''
+    Drops a random playable card, sometimes takes instead.
+    '''
+    if game.type_chooser:
+        return ('suit', rng.choice(config.TYPES))
+
+    legal = game.legal_moves(id)
+    if legal and rng.random() < 0.8:
+        return ('card', rng.choice(list(engine.bits(legal))))
+
+    return take(game)
+
+
+def greedy_policy(game: engine.Game, id: int, rng: random.Random) -> tuple:
+    '''
+    Flushes queens when possible, otherwise drops the most expensive playable card.
+    '''
+    player = game.players[id]
+
+    if game.type_chooser:
+        # the suit the player has the most cards of
+        counts = {i: 0 for i in config.TYPES}
+        for i in player.cards:
+            counts[i.type] += 1
+        return ('suit', max(config.TYPES, key=lambda i: counts[i]))
+
+    if player.is_queen_winnable:
+        return ('queen',)
+
+    legal = game.legal_moves(id)
+    if legal:
+        return ('card', max(engine.bits(legal), key=lambda i: engine.CARD_COSTS[i]))
+
+    return take(game)
+
+
+POLICIES: Dict[str, Policy] = {
+    'random': random_policy,
+    'greedy': greedy_policy
+}
+
+
+# playing
+
+class Recorder:
+    def __init__(self):
+        '''
+        Receives the events of a game, remembering how it went.
+        '''
+        self.over = False
+
+
+    def emit(self, event: events.Event):
+        if isinstance(event, events.GameOver):
+            self.over = True
+
+
+def apply(game: engine.Game, id: int, action: tuple) -> bool:
+    '''
+    Applies a policy action to the game.
+    '''
+    return game.act(id, action)
+
+
+def play(seed: int, policies: List[Policy], max_moves: int = 5000) -> dict:
+    '''
+    Plays a game between two policies and returns the result.
+    '''
+    rng = random.Random(seed)
+    recorder = Recorder()
+    game = engine.Game(recorder.emit, [(1, 'a'), (2, 'b')], 0, 0, seed)
+    game.ready_up()
+
+    moves = 0
+    while not recorder.over and moves < max_moves:
+        if game.waiting:
+            game.new_round()
+            continue
+
+        policy = policies[game.turn - 1]
+        apply(game, game.turn, policy(game, game.turn, rng))
+        moves += 1
+
+    return {
+        'over': recorder.over,
+        'rounds': game.round,
+        'moves': moves,
+        'pts': [i.pts for i in game.players.values()]
+    }
+
+
+def simulate(seed: int, games: int, policies: List[str]) -> List[dict]:
+    '''
+    Plays a batch of games, used as a process pool task.
+    '''
+    chosen = [POLICIES[i] for i in policies]
+    return [play(seed + i, chosen) for i in range(games)]
+
+
+# reporting
+
+def report(results: List[dict], elapsed: float):
+    over = [i for i in results if i['over']]
+
+    print(f'games: {len(results)} in {elapsed:.1f}s ({len(results) / elapsed:.0f} games/s)')
+    print(f'stalled: {len(results) - len(over)}')
+    if len(over) == 0: return
+
+    print(f'avg rounds: {sum([i["rounds"] for i in over]) / len(over):.2f}')
+    print(f'avg moves: {sum([i["moves"] for i in over]) / len(over):.1f}')
+
+    # how far past 105 the loser ended up
+    losers = [max(i['pts']) for i in over]
+    buckets: Dict[int, int] = {}
+    for i in losers:
+        bucket = (i - 105) // 10 * 10 + 105
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+
+    print('loser points:')
+    for i in sorted(buckets):
+        share = buckets[i] / len(over)
+        print(f'  {i:>3}-{i + 9:<3} {share * 100:5.1f}% {"#" * round(share * 50)}')
+
+    first = len([i for i in over if i['pts'][0] >= 105])
+    print(f'lost by player 1: {first / len(over) * 100:.1f}%')
+
+
+if __name__ == '__main__':
+    # only the command line needs these, workers import this module
+    import argparse
+    from concurrent.futures import ProcessPoolExecutor
+
+    parser = argparse.ArgumentParser(description='Plays Shulpek games without Telegram.')
+    parser.add_argument('-n', '--games', type=int, default=10000)
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='processes, all cores by default')
+    parser.add_argument('--chunk', type=int, default=1000, help='games per task')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--policy', nargs='+', default=['random'], choices=list(POLICIES))
+    args = parser.parse_args()
+
+    policies = (args.policy * 2)[:2]
+    chunks = [
+        (args.seed + i, min(args.chunk, args.games - i), policies)
+        for i in range(0, args.games, args.chunk)
+    ]
+
+    start = time.perf_counter()
+    with ProcessPoolExecutor(args.jobs) as pool:
+        results = []
+        for i in pool.map(simulate, *zip(*chunks)):
+            results.extend(i)
+
+    report(results, time.perf_counter() - start)
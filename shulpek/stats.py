@@ -0,0 +1,433 @@
+'''
+Player statistics and the leaderboard.
+'''
+from typing import *
+
+import abc
+import asyncio
+import heapq
+import json
+import logging
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import engine
+from . import events
+from . import store
+
+
+# counters kept for every player
+FIELDS = ['games', 'wins', 'rounds', 'flushes', 'points']
+
+
+class Counters(abc.ABC):
+    def __init__(self, interval: float = 1.0, top: int = 10):
+        '''
+        Keeps the totals of every player in memory, so commands never
+        query the database, and collects the changes to be written
+        every `interval` seconds.
+        '''
+        self.interval: float = interval
+        self.size: int = top
+
+        # player id -> [name, *FIELDS]
+        self.players: Dict[int, list] = {}
+        self.leaders: List[Tuple[int, list]] = None
+
+        # changes not written yet
+        self.pending: Dict[int, list] = {}
+        self.results: List[tuple] = []
+        self.scheduled: bool = False
+        self.writes: Set[asyncio.Future] = set()
+
+
+    def get(self, id: int) -> Optional[list]:
+        '''
+        Returns [name, *FIELDS] of a player.
+        '''
+        return self.players.get(id)
+
+
+    def top(self) -> List[Tuple[int, list]]:
+        '''
+        Returns the players with the most wins, computed again
+        only after the totals change.
+        '''
+        if self.leaders == None:
+            self.leaders = heapq.nlargest(
+                self.size, self.players.items(),
+                key=lambda i: (i[1][2], i[1][2] / max(i[1][1], 1))
+            )
+
+        return self.leaders
+
+
+    def add(self, player: engine.Player, **amounts: int):
+        '''
+        Adds to the player's counters.
+        '''
+        row = self.players.setdefault(player.id, [player.name] + [0] * len(FIELDS))
+        change = self.pending.setdefault(player.id, [player.name] + [0] * len(FIELDS))
+        row[0] = change[0] = player.name
+
+        for name, amount in amounts.items():
+            index = FIELDS.index(name) + 1
+            row[index] += amount
+            change[index] += amount
+
+        self.leaders = None
+
+
+    def update(self, totals: Dict[int, list]):
+        '''
+        Takes the totals other processes wrote, keeping what
+        this one didn't write yet on top of them.
+        '''
+        for id, row in totals.items():
+            change = self.pending.get(id)
+            if change != None:
+                row = [change[0]] + [a + b for a, b in zip(row[1:], change[1:])]
+
+            self.players[id] = row
+
+        self.leaders = None
+
+
+    def handle(self, batch: List[events.Event]):
+        '''
+        Event stream consumer.
+        '''
+        for event in batch:
+            game = event.game
+
+            if isinstance(event, events.RoundEnded):
+                self.add(game.players[game.get_other_player(event.loser)], rounds=1)
+                self.add(game.players[event.loser], points=event.points)
+
+            elif isinstance(event, events.QueenFlush):
+                self.add(game.players[event.player], flushes=1)
+
+            elif isinstance(event, events.GameOver) and game.ready:
+                now = int(time.time())
+
+                for i in game.players.values():
+                    # only a game played to the end has a winner
+                    won = int(event.reason == 'points' and i.pts < 105)
+
+                    self.add(i, games=1, wins=won)
+                    self.results.append((game.id, i.id, won, i.pts, game.round, event.reason, now))
+
+        if len(self.pending) > 0:
+            self.schedule()
+
+
+    def schedule(self):
+        if self.scheduled: return
+
+        self.scheduled = True
+        asyncio.get_running_loop().call_later(self.interval, self.flush)
+
+
+    def take(self) -> Tuple[List[tuple], List[tuple]]:
+        '''
+        Returns the collected changes and results, and forgets them.
+        '''
+        changes = [(id, *i) for id, i in self.pending.items()]
+        results = self.results
+        self.pending = {}
+        self.results = []
+
+        return changes, results
+
+
+    @abc.abstractmethod
+    def flush(self):
+        '''
+        Writes the collected changes in the background.
+        '''
+
+
+    async def start(self):
+        pass
+
+
+    @abc.abstractmethod
+    async def close(self):
+        '''
+        Writes everything left.
+        '''
+
+
+class Stats(Counters):
+    def __init__(self, path: str, interval: float = 1.0, top: int = 10, shared: bool = False):
+        '''
+        Records game results and keeps per-player totals in SQLite.
+
+        Changes are written on a background thread. If other processes
+        write to the same database (`shared`), e.g. shards, the totals
+        are read again whenever they did.
+        '''
+        super().__init__(interval, top)
+        self.path: str = path
+        self.shared: bool = shared
+
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=30)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS results (game INTEGER NOT NULL, player INTEGER NOT NULL, '
+            'won INTEGER NOT NULL, pts INTEGER NOT NULL, rounds INTEGER NOT NULL, '
+            'reason TEXT NOT NULL, time INTEGER NOT NULL)'
+        )
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS players (id INTEGER PRIMARY KEY, name TEXT NOT NULL, '
+            + ', '.join([f'{i} INTEGER NOT NULL' for i in FIELDS]) + ')'
+        )
+        self.db.commit()
+
+        # changes when another connection commits
+        self.version: int = self.db.execute('PRAGMA data_version').fetchone()[0]
+        self.players = self.load()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+
+    def load(self) -> Dict[int, list]:
+        return {
+            i[0]: list(i[1:]) for i in self.db.execute(f'SELECT id, name, {", ".join(FIELDS)} FROM players')
+        }
+
+
+    async def start(self):
+        '''
+        Starts looking for the changes of other processes.
+        '''
+        if self.shared:
+            self.schedule()
+
+
+    def flush(self):
+        '''
+        Writes the collected changes in the background.
+        '''
+        self.scheduled = False
+
+        # a shared database is checked all the time
+        if self.shared:
+            self.schedule()
+
+            # the totals read back must include every change written before
+            if len(self.writes) > 0: return
+        elif len(self.pending) == 0:
+            return
+
+        write = asyncio.get_running_loop().run_in_executor(self.executor, self.write, *self.take())
+        self.writes.add(write)
+        write.add_done_callback(self.writes.discard)
+        write.add_done_callback(self.written)
+
+
+    def write(self, changes: List[tuple], results: List[tuple]) -> Optional[Dict[int, list]]:
+        '''
+        Returns the totals if another process changed them.
+        '''
+        if len(changes) > 0:
+            with self.db:
+                self.db.executemany(
+                    f'INSERT INTO players (id, name, {", ".join(FIELDS)}) VALUES ({", ".join(["?"] * (len(FIELDS) + 2))}) '
+                    'ON CONFLICT (id) DO UPDATE SET name = excluded.name, '
+                    + ', '.join([f'{i} = {i} + excluded.{i}' for i in FIELDS]),
+                    changes
+                )
+                self.db.executemany('INSERT INTO results VALUES (?, ?, ?, ?, ?, ?, ?)', results)
+
+        if not self.shared: return None
+
+        version = self.db.execute('PRAGMA data_version').fetchone()[0]
+        if version == self.version: return None
+
+        self.version = version
+        return self.load()
+
+
+    def written(self, write: asyncio.Future):
+        if write.cancelled() or write.exception() != None or write.result() == None:
+            return
+
+        self.players = {}
+        self.update(write.result())
+
+
+    async def close(self):
+        '''
+        Writes everything left and closes the database.
+        '''
+        self.shared = False
+        if len(self.writes) > 0:
+            await asyncio.gather(*self.writes)
+
+        self.flush()
+        if len(self.writes) > 0:
+            await asyncio.gather(*self.writes)
+
+        self.executor.shutdown()
+        self.db.close()
+
+
+# KEYS: set of the players, list of the results, channel
+# ARGV: key prefix, changes, results
+ADD = '''
+local fields = {''' + ', '.join([f"'{i}'" for i in FIELDS]) + '''}
+local totals = {}
+
+for _, change in ipairs(cjson.decode(ARGV[2])) do
+    local key = ARGV[1] .. change[1]
+    redis.call('SADD', KEYS[1], change[1])
+    redis.call('HSET', key, 'name', change[2])
+
+    local row = {change[2]}
+    for i, field in ipairs(fields) do
+        row[i + 1] = redis.call('HINCRBY', key, field, change[i + 2])
+    end
+    totals[change[1]] = row
+end
+
+for _, result in ipairs(cjson.decode(ARGV[3])) do
+    redis.call('RPUSH', KEYS[2], cjson.encode(result))
+end
+
+redis.call('PUBLISH', KEYS[3], cjson.encode(totals))
+return 1
+'''
+
+# KEYS: set of the players
+# ARGV: key prefix
+LOAD = '''
+local fields = {''' + ', '.join([f"'{i}'" for i in FIELDS]) + '''}
+local totals = {}
+
+for _, id in ipairs(redis.call('SMEMBERS', KEYS[1])) do
+    totals[id] = redis.call('HMGET', ARGV[1] .. id, 'name', unpack(fields))
+end
+
+return cjson.encode(totals)
+'''
+
+
+class RedisStats(Counters):
+    def __init__(self, client: Any, prefix: str = 'shulpek', interval: float = 1.0, top: int = 10):
+        '''
+        Keeps the totals in Redis hashes, shared by every instance.
+
+        Every write announces the new totals of the changed players,
+        so all instances keep the same totals in memory.
+        '''
+        super().__init__(interval, top)
+        self.client = client
+        self.prefix: str = f'{prefix}:stats:'
+        self.keys: List[str] = [f'{prefix}:stats', f'{prefix}:results', f'{prefix}:stats-changed']
+
+        self.add_script = client.register_script(ADD)
+        self.load_script = client.register_script(LOAD)
+        self.task: asyncio.Task = None
+
+
+    async def start(self):
+        '''
+        Loads the totals and starts following the changes.
+        '''
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.keys[2])
+
+        # subscribed first, so nothing written meanwhile is missed
+        self.update(decode(await self.load_script(keys=self.keys[:1], args=[self.prefix])))
+
+        async def run():
+            async for message in pubsub.listen():
+                if message['type'] != 'message': continue
+
+                try:
+                    self.update(decode(message['data']))
+                except Exception:
+                    logging.exception('failed to update the stats')
+
+        self.task = asyncio.create_task(run())
+
+
+    def flush(self):
+        '''
+        Writes the collected changes in the background.
+        '''
+        self.scheduled = False
+        if len(self.pending) == 0: return
+
+        changes, results = self.take()
+        write = asyncio.ensure_future(self.add_script(keys=self.keys, args=[
+            self.prefix,
+            json.dumps([(str(i[0]), *i[1:]) for i in changes], ensure_ascii=False),
+            json.dumps(results, ensure_ascii=False)
+        ]))
+        self.writes.add(write)
+        write.add_done_callback(self.writes.discard)
+        write.add_done_callback(self.written)
+
+
+    def written(self, write: asyncio.Future):
+        if not write.cancelled() and write.exception() != None:
+            logging.error('failed to write the stats', exc_info=write.exception())
+
+
+    async def close(self):
+        '''
+        Writes everything left, the client is closed by its owner.
+        '''
+        self.flush()
+        if len(self.writes) > 0:
+            await asyncio.gather(*self.writes, return_exceptions=True)
+
+        if self.task != None:
+            self.task.cancel()
+
+
+def decode(data: str) -> Dict[int, list]:
+    # empty lua tables are encoded as objects too
+    return {
+        int(id): [row[0]] + [int(i or 0) for i in row[1:]]
+        for id, row in json.loads(data).items()
+    }
+
+
+# in-memory stand-ins of the scripts
+
+def fake_add(redis: store.FakeRedis, keys: List[str], args: List[str]) -> int:
+    values = redis.server.values
+    totals = {}
+
+    for id, name, *amounts in json.loads(args[1]):
+        values.setdefault(keys[0], set()).add(id)
+        row = values.setdefault(args[0] + id, {})
+        row['name'] = name
+
+        for field, amount in zip(FIELDS, amounts):
+            row[field] = str(int(row.get(field, '0')) + amount)
+        totals[id] = [name] + [int(row[i]) for i in FIELDS]
+
+    values.setdefault(keys[1], []).extend([json.dumps(i) for i in json.loads(args[2])])
+    redis.publish(keys[2], json.dumps(totals))
+
+    return 1
+
+
+def fake_load(redis: store.FakeRedis, keys: List[str], args: List[str]) -> str:
+    values = redis.server.values
+    totals = {}
+
+    for id in values.get(keys[0], set()):
+        row = values[args[0] + id]
+        totals[id] = [row['name']] + [row.get(i) for i in FIELDS]
+
+    return json.dumps(totals)
+
+
+store.SCRIPTS[ADD] = fake_add
+store.SCRIPTS[LOAD] = fake_load
@@ -0,0 +1,102 @@
+'''
+SQLite snapshots of the ongoing games.
+'''
+from typing import *
+
+import asyncio
+import json
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+
+from . import engine
+
+
+class Storage:
+    def __init__(self, path: str):
+        '''
+        Stores game snapshots in a SQLite database.
+
+        Changes made during one event loop tick are written together
+        in a single transaction on a background thread.
+        '''
+        self.path: str = path
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS games (id INTEGER PRIMARY KEY, data TEXT NOT NULL)')
+        self.db.commit()
+
+        # game id -> game to save, or None to delete
+        self.dirty: Dict[int, Optional[engine.Game]] = {}
+        self.scheduled: bool = False
+        self.writes: Set[asyncio.Future] = set()
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+
+    def load(self) -> List[dict]:
+        '''
+        Returns all stored snapshots.
+        '''
+        return [json.loads(i[0]) for i in self.db.execute('SELECT data FROM games')]
+
+
+    def save(self, game: engine.Game):
+        '''
+        Marks a game to be saved on the next flush.
+        '''
+        self.dirty[game.id] = game
+        self.schedule()
+
+
+    def delete(self, id: int):
+        '''
+        Marks a game to be deleted on the next flush.
+        '''
+        self.dirty[id] = None
+        self.schedule()
+
+
+    def schedule(self):
+        if self.scheduled: return
+
+        self.scheduled = True
+        asyncio.get_running_loop().call_soon(self.flush)
+
+
+    def flush(self):
+        '''
+        Snapshots the changed games and writes them in the background.
+        '''
+        self.scheduled = False
+        if len(self.dirty) == 0: return
+
+        saved = []
+        deleted = []
+        for id, game in self.dirty.items():
+            if game == None:
+                deleted.append((id,))
+            else:
+                saved.append((id, json.dumps(game.to_dict(), ensure_ascii=False, separators=(',', ':'))))
+        self.dirty = {}
+
+        write = asyncio.get_running_loop().run_in_executor(self.executor, self.write, saved, deleted)
+        self.writes.add(write)
+        write.add_done_callback(self.writes.discard)
+
+
+    def write(self, saved: List[Tuple[int, str]], deleted: List[Tuple[int]]):
+        with self.db:
+            self.db.executemany('INSERT OR REPLACE INTO games (id, data) VALUES (?, ?)', saved)
+            self.db.executemany('DELETE FROM games WHERE id = ?', deleted)
+
+
+    async def close(self):
+        '''
+        Writes everything left and closes the database.
+        '''
+        self.flush()
+        if len(self.writes) > 0:
+            await asyncio.gather(*self.writes)
+
+        self.executor.shutdown()
+        self.db.close()
@@ -0,0 +1,311 @@
+'''
+State stores behind `manager.Manager`.
+
+The manager always keeps the games it works with in its own dicts.
+With `MemoryStore` those dicts are the whole state. With `RedisStore`
+they are a read cache of games stored in Redis, so several bot
+instances can serve the same games.
+'''
+from typing import *
+
+import asyncio
+import json
+import logging
+import uuid
+
+if TYPE_CHECKING:
+    from .engine import Game
+
+
+class MemoryStore:
+    '''
+    Keeps the games in this process only, so there is nothing to do.
+    '''
+    shared = False
+
+    async def load(self, id: int) -> Optional[dict]: return None
+
+    async def find(self, user: int) -> Optional[int]: return None
+
+    async def save(self, game: "Game") -> bool: return True
+
+    async def link(self, game: "Game", users: Iterable[int]): pass
+
+    async def delete(self, game: "Game"): pass
+
+    async def listen(self, changed: Callable[[int], Any]): pass
+
+    async def close(self): pass
+
+
+# KEYS: game, channel
+# ARGV: revision the change is based on, snapshot, invalidation message
+SAVE = '''
+local revision = tonumber(redis.call('HGET', KEYS[1], 'revision') or '0')
+if revision ~= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('HSET', KEYS[1], 'revision', revision + 1, 'data', ARGV[2])
+redis.call('PUBLISH', KEYS[2], ARGV[3])
+return revision + 1
+'''
+
+# KEYS: playing keys of the users
+# ARGV: game id, game key prefix
+LINK = '''
+for _, key in ipairs(KEYS) do
+    local current = redis.call('GET', key)
+    -- a user stays linked to a game that still exists
+    if not current or current == ARGV[1] or redis.call('EXISTS', ARGV[2] .. current) == 0 then
+        redis.call('SET', key, ARGV[1])
+    end
+end
+return 1
+'''
+
+# KEYS: game, channel, playing keys of the players
+# ARGV: invalidation message, game id
+DELETE = '''
+redis.call('DEL', KEYS[1])
+for i = 3, #KEYS do
+    if redis.call('GET', KEYS[i]) == ARGV[2] then
+        redis.call('DEL', KEYS[i])
+    end
+end
+redis.call('PUBLISH', KEYS[2], ARGV[1])
+return 1
+'''
+
+
+class RedisStore:
+    shared = True
+
+    def __init__(self, client: Any, prefix: str = 'shulpek'):
+        '''
+        Stores game snapshots in Redis.
+
+        Every snapshot has a revision, a change is only saved if the
+        revision is still the one the change was based on. Every save
+        is announced on a channel, so the other instances drop their
+        cached copy of the game.
+        '''
+        self.client = client
+        self.prefix: str = prefix
+        self.channel: str = f'{prefix}:changed'
+
+        # this instance's own announcements are skipped
+        self.origin: str = uuid.uuid4().hex
+        # game id -> revision of the cached copy
+        self.revisions: Dict[int, int] = {}
+
+        self.save_script = client.register_script(SAVE)
+        self.link_script = client.register_script(LINK)
+        self.delete_script = client.register_script(DELETE)
+        self.task: asyncio.Task = None
+
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisStore":
+        try:
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError('install the redis package to store games in Redis')
+
+        return cls(redis.asyncio.from_url(url, decode_responses=True), **kwargs)
+
+
+    def game_key(self, id: int) -> str:
+        return f'{self.prefix}:game:{id}'
+
+
+    def playing_key(self, user: int) -> str:
+        return f'{self.prefix}:playing:{user}'
+
+
+    async def load(self, id: int) -> Optional[dict]:
+        revision, data = await self.client.hmget(self.game_key(id), 'revision', 'data')
+        if data == None:
+            return None
+
+        self.revisions[id] = int(revision)
+        return json.loads(data)
+
+
+    async def find(self, user: int) -> Optional[int]:
+        '''
+        Returns the id of the game the user is playing.
+        '''
+        id = await self.client.get(self.playing_key(user))
+        return int(id) if id != None else None
+
+
+    async def save(self, game: "Game") -> bool:
+        data = json.dumps(game.to_dict(), ensure_ascii=False, separators=(',', ':'))
+
+        base = self.revisions.get(game.id, 0)
+        revision = await self.save_script(
+            keys=[self.game_key(game.id), self.channel],
+            args=[base, data, f'{self.origin}:{game.id}:{base + 1}']
+        )
+
+        if revision == 0:
+            self.revisions.pop(game.id, None)
+            return False
+
+        self.revisions[game.id] = int(revision)
+        return True
+
+
+    async def link(self, game: "Game", users: Iterable[int]):
+        '''
+        Marks the users as playing the game, unless they play another one.
+        '''
+        await self.link_script(
+            keys=[self.playing_key(i) for i in users],
+            args=[game.id, self.game_key('')]
+        )
+
+
+    async def delete(self, game: "Game"):
+        self.revisions.pop(game.id, None)
+
+        await self.delete_script(
+            keys=[self.game_key(game.id), self.channel, *[self.playing_key(i) for i in game.players]],
+            args=[f'{self.origin}:{game.id}', game.id]
+        )
+
+
+    async def listen(self, changed: Callable[[int], Any]):
+        '''
+        Calls `changed` with the id of every game another instance changes.
+        '''
+        pubsub = self.client.pubsub()
+        await pubsub.subscribe(self.channel)
+
+        async def run():
+            async for message in pubsub.listen():
+                if message['type'] != 'message': continue
+
+                origin, id, revision = (message['data'].split(':') + [None])[:3]
+                if origin == self.origin: continue
+
+                # a late announcement of a save the cached copy already has
+                if revision != None and self.revisions.get(int(id), 0) >= int(revision):
+                    continue
+
+                self.revisions.pop(int(id), None)
+                try:
+                    changed(int(id))
+                except Exception:
+                    logging.exception('failed to drop a changed game')
+
+        self.task = asyncio.create_task(run())
+
+
+    async def close(self):
+        if self.task != None:
+            self.task.cancel()
+
+        await self.client.aclose()
+
+
+# in-memory stand-in
+
+class FakeServer:
+    def __init__(self):
+        '''
+        The data of a fake Redis, shared by all its clients.
+        '''
+        self.values: Dict[str, Any] = {}
+        self.channels: Dict[str, List[asyncio.Queue]] = {}
+
+
+class FakePubSub:
+    def __init__(self, server: FakeServer):
+        self.server: FakeServer = server
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+
+    async def subscribe(self, channel: str):
+        self.server.channels.setdefault(channel, []).append(self.queue)
+
+
+    async def listen(self) -> AsyncIterator[dict]:
+        while True:
+            yield await self.queue.get()
+
+
+class FakeRedis:
+    def __init__(self, server: FakeServer = None):
+        '''
+        Implements the few Redis commands `RedisStore` uses, clients
+        made with the same server see the same data.
+        '''
+        self.server: FakeServer = server if server != None else FakeServer()
+
+
+    async def hmget(self, key: str, *fields: str) -> List[Optional[str]]:
+        value = self.server.values.get(key, {})
+        return [value.get(i) for i in fields]
+
+
+    async def get(self, key: str) -> Optional[str]:
+        return self.server.values.get(key)
+
+
+    def publish(self, channel: str, message: str):
+        for i in self.server.channels.get(channel, []):
+            i.put_nowait({'type': 'message', 'channel': channel, 'data': message})
+
+
+    def pubsub(self) -> FakePubSub:
+        return FakePubSub(self.server)
+
+
+    def register_script(self, source: str) -> Callable[..., Awaitable]:
+        script = SCRIPTS[source]
+
+        async def call(keys: list = [], args: list = []):
+            # scripts run atomically, like in Redis
+            return script(self, keys, [str(i) for i in args])
+
+        return call
+
+
+    def save(self, keys: List[str], args: List[str]) -> int:
+        value = self.server.values.get(keys[0], {})
+        revision = int(value.get('revision', '0'))
+        if revision != int(args[0]):
+            return 0
+
+        self.server.values[keys[0]] = {'revision': str(revision + 1), 'data': args[1]}
+        self.publish(keys[1], args[2])
+
+        return revision + 1
+
+
+    def link(self, keys: List[str], args: List[str]) -> int:
+        for i in keys:
+            current = self.server.values.get(i)
+            if current == None or current == args[0] or args[1] + current not in self.server.values:
+                self.server.values[i] = args[0]
+
+        return 1
+
+
+    def delete(self, keys: List[str], args: List[str]) -> int:
+        self.server.values.pop(keys[0], None)
+
+        for i in keys[2:]:
+            if self.server.values.get(i) == args[1]:
+                self.server.values.pop(i)
+
+        self.publish(keys[1], args[0])
+        return 1
+
+
+    async def aclose(self): pass
+
+
+# script source -> the same in python, taking the client, keys and arguments
+SCRIPTS: Dict[str, Callable] = {SAVE: FakeRedis.save, LINK: FakeRedis.link, DELETE: FakeRedis.delete}
@@ -0,0 +1,56 @@
+'''
+Stream delivering the game events to their consumers.
+'''
+from typing import *
+
+import asyncio
+import logging
+
+from .events import Event
+
+
+class EventStream:
+    def __init__(self):
+        '''
+        Fans published events out to every subscriber's queue.
+
+        Publishing never waits, so the engine doesn't depend on
+        how fast the consumers are.
+        '''
+        self.queues: List[asyncio.Queue] = []
+
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue()
+        self.queues.append(queue)
+
+        return queue
+
+
+    def publish(self, event: Event):
+        for i in self.queues:
+            i.put_nowait(event)
+
+
+async def drain(queue: asyncio.Queue) -> List[Event]:
+    '''
+    Waits for an event and returns it with every other one already queued.
+    '''
+    batch = [await queue.get()]
+    while not queue.empty():
+        batch.append(queue.get_nowait())
+
+    return batch
+
+
+async def consume(queue: asyncio.Queue, handler: Callable[[List[Event]], Any]):
+    '''
+    Passes batches of events from the queue to the handler forever.
+    '''
+    while True:
+        batch = await drain(queue)
+
+        try:
+            handler(batch)
+        except Exception:
+            logging.exception('event handler failed')
@@ -0,0 +1,144 @@
+'''
+Hashed timer wheel for delayed game transitions.
+'''
+from typing import *
+
+import asyncio
+import inspect
+import logging
+import math
+
+
+class Timer:
+    def __init__(self,
+        key: Tuple[int, str],
+        callback: Callable[[], Any],
+        slot: int,
+        rounds: int
+    ):
+        '''
+        Represents a scheduled callback.
+        '''
+        self.key = key
+        self.callback = callback
+        self.slot = slot
+        self.rounds = rounds
+
+
+class TimerWheel:
+    def __init__(self, tick: float = 0.5, slots: int = 512):
+        '''
+        Runs every delayed callback from a single task.
+
+        Timers are put into `slots` buckets by their deadline, so
+        scheduling and cancelling are O(1) and each tick only looks
+        at one bucket.
+        '''
+        self.tick: float = tick
+        self.slots: int = slots
+
+        self.wheel: List[Dict[Tuple[int, str], Timer]] = [{} for _ in range(slots)]
+        self.timers: Dict[Tuple[int, str], Timer] = {}
+        self.owners: Dict[int, Set[str]] = {}
+        self.cursor: int = 0
+
+        self.task: asyncio.Task = None
+        self.running: Set[asyncio.Task] = set()
+
+
+    def schedule(self,
+        owner: int, kind: str,
+        delay: float,
+        callback: Callable[[], Any]
+    ):
+        '''
+        Schedules a callback, replacing the owner's timer of the same kind.
+        '''
+        self.cancel(owner, kind)
+
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self.cursor + ticks) % self.slots
+        timer = Timer((owner, kind), callback, slot, (ticks - 1) // self.slots)
+
+        self.wheel[slot][timer.key] = timer
+        self.timers[timer.key] = timer
+        self.owners.setdefault(owner, set()).add(kind)
+
+        if self.task == None:
+            self.task = asyncio.create_task(self.run())
+
+
+    def cancel(self, owner: int, kind: str = None):
+        '''
+        Cancels the owner's timer of the kind, or all of them.
+        '''
+        kinds = self.owners.get(owner)
+        if kinds == None: return
+
+        for i in ([kind] if kind != None else list(kinds)):
+            timer = self.timers.pop((owner, i), None)
+            if timer == None: continue
+
+            self.wheel[timer.slot].pop(timer.key, None)
+            kinds.discard(i)
+
+        if len(kinds) == 0:
+            self.owners.pop(owner)
+
+
+    def fire(self, timer: Timer):
+        '''
+        Runs the timer's callback. Callbacks that only change the game
+        state run right in the tick, the ones that wait for the store
+        get their own task.
+        '''
+        owner, kind = timer.key
+        self.timers.pop(timer.key)
+        self.owners[owner].discard(kind)
+        if len(self.owners[owner]) == 0:
+            self.owners.pop(owner)
+
+        try:
+            result = timer.callback()
+        except Exception:
+            logging.exception('timer callback failed')
+            return
+
+        if inspect.isawaitable(result):
+            task = asyncio.ensure_future(result)
+            self.running.add(task)
+            task.add_done_callback(self.finished)
+
+
+    def finished(self, task: asyncio.Task):
+        self.running.discard(task)
+
+        if not task.cancelled() and task.exception() != None:
+            logging.error('timer callback failed', exc_info=task.exception())
+
+
+    async def run(self):
+        '''
+        Advances the wheel until no timers are left.
+        '''
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+
+        try:
+            while len(self.timers) > 0:
+                next_tick += self.tick
+                await asyncio.sleep(max(0, next_tick - loop.time()))
+
+                self.cursor = (self.cursor + 1) % self.slots
+                bucket = self.wheel[self.cursor]
+
+                for key, timer in list(bucket.items()):
+                    if timer.rounds > 0:
+                        timer.rounds -= 1
+                        continue
+
+                    bucket.pop(key)
+                    self.fire(timer)
+
+        finally:
+            self.task = None
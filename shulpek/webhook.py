@@ -0,0 +1,114 @@
+'''
+Webhook mode: an aiohttp server feeding updates into the dispatcher.
+'''
+from typing import *
+
+import asyncio
+import logging
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher, types
+
+
+class WebhookServer:
+    def __init__(self,
+        dp: Dispatcher,
+        bot: Bot,
+        url: str = None,
+        host: str = '0.0.0.0',
+        port: int = 8080,
+        path: str = '/webhook',
+        secret: str = None,
+        workers: int = 16,
+        queue_size: int = 1000
+    ):
+        '''
+        Receives updates over HTTP and processes them with a fixed
+        amount of workers.
+
+        When the intake queue is full, updates are answered with 503
+        so Telegram delivers them again later.
+        '''
+        self.dp: Dispatcher = dp
+        self.bot: Bot = bot
+        self.url: str = url
+        self.host: str = host
+        self.port: int = port
+        self.path: str = path
+        self.secret: str = secret
+        self.workers: int = workers
+
+        self.queue: asyncio.Queue = asyncio.Queue(queue_size)
+        self.tasks: List[asyncio.Task] = []
+
+
+    async def handle(self, request: web.Request) -> web.Response:
+        '''
+        Puts an incoming update into the queue.
+        '''
+        if self.secret != None and \
+            request.headers.get('X-Telegram-Bot-Api-Secret-Token') != self.secret:
+            return web.Response(status=401)
+
+        try:
+            update = types.Update.model_validate(await request.json(), context={'bot': self.bot})
+        except Exception:
+            return web.Response(status=400)
+
+        # the queue may fill up while the body is read
+        try:
+            self.queue.put_nowait(update)
+        except asyncio.QueueFull:
+            return web.Response(status=503)
+
+        return web.Response()
+
+
+    async def worker(self):
+        '''
+        Feeds queued updates to the dispatcher.
+        '''
+        while True:
+            update = await self.queue.get()
+
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                logging.exception(f'failed to process update {update.update_id}')
+            finally:
+                self.queue.task_done()
+
+
+    async def run(self):
+        '''
+        Starts the server and serves until cancelled.
+        '''
+        app = web.Application()
+        app.router.add_post(self.path, self.handle)
+
+        runner = web.AppRunner(app)
+        await runner.setup()
+
+        workflow_data = {'dispatcher': self.dp, 'bots': [self.bot], **self.dp.workflow_data}
+        await self.dp.emit_startup(bot=self.bot, **workflow_data)
+
+        self.tasks = [asyncio.create_task(self.worker()) for _ in range(self.workers)]
+
+        try:
+            await web.TCPSite(runner, self.host, self.port).start()
+
+            if self.url != None:
+                await self.bot.set_webhook(self.url + self.path, secret_token=self.secret)
+
+            await asyncio.Event().wait()
+
+        finally:
+            await runner.cleanup()
+
+            # finishing what was already accepted
+            await self.queue.join()
+            for i in self.tasks:
+                i.cancel()
+
+            await self.dp.emit_shutdown(bot=self.bot, **workflow_data)
+            await self.bot.session.close()
@@ -0,0 +1,55 @@
+'''
+Chosen inline results arriving more than once.
+'''
+from typing import *
+
+from shulpek import answers, engine, routes
+
+
+def started() -> engine.Game:
+    game = engine.Game(lambda event: None, [(1, 'a'), (2, 'b')], -1, 1, 0)
+    game.ready_up()
+    return game
+
+
+def choose(game: engine.Game, id: str) -> bool:
+    '''
+    Applies a chosen result like the bot does.
+    '''
+    return game.act(game.turn, routes.parse_result(id))
+
+
+def test_double_take_keeps_the_turn():
+    game = started()
+    turn = game.turn
+    count = game.players[turn].count
+
+    ids = [i.id for i in answers.build(game, turn)]
+    assert 'take' in ids
+
+    assert choose(game, 'take')
+    assert not choose(game, 'take')
+
+    assert game.turn == turn
+    assert game.players[turn].count == count + 1
+    assert 'pass' in [i.id for i in answers.build(game, turn)]
+
+
+def test_double_card_plays_it_once():
+    game = started()
+    turn = game.turn
+    player = game.players[turn]
+
+    # two sixes on a six, the turn stays with the player
+    game.stack = engine.DECK[engine.card_index('6', '♥')]
+    game.suit = None
+    player.hand = engine.mask_of([engine.card_index('6', '♣'), engine.card_index('6', '♠')])
+
+    ids = [i.id for i in answers.build(game, turn) if i.id.startswith('card:')]
+    assert len(ids) == 2
+
+    assert choose(game, ids[0])
+    assert not choose(game, ids[0])
+
+    assert game.turn == turn
+    assert [str(i) for i in player.cards] == [str(engine.DECK[int(ids[1][5:])])]
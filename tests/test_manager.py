@@ -0,0 +1,141 @@
+'''
+Two instances sharing games through a fake Redis.
+'''
+from typing import *
+
+import asyncio
+import random
+
+from shulpek import engine, sim
+from shulpek.manager import Manager
+from shulpek.store import FakeRedis, FakeServer, RedisStore
+
+
+def run(test: Callable[[Manager, Manager], Awaitable]):
+    async def main():
+        server = FakeServer()
+        managers = [Manager(RedisStore(FakeRedis(server))) for _ in range(2)]
+        for i in managers:
+            await i.start()
+
+        try:
+            await test(*managers)
+        finally:
+            for i in managers:
+                await i.store.close()
+
+    asyncio.run(main())
+
+
+async def settle():
+    # lets the invalidations arrive
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+async def round_break(mg: Manager) -> engine.Game:
+    '''
+    Returns a started game played until its first round ended.
+    '''
+    rng = random.Random(0)
+    game = await mg.new_game([(1, 'a'), (2, 'b')], -1, 1)
+    await mg.ready_up(game)
+
+    # random moves may keep a round going for long
+    for _ in range(1000):
+        if game.waiting: break
+
+        turn = game.turn
+        action = sim.greedy_policy(game, turn, rng)
+        assert await mg.apply(game, lambda game: sim.apply(game, turn, action))
+
+    assert game.waiting
+    return game
+
+
+def test_rejected_change_keeps_timers():
+    async def test(first: Manager, second: Manager):
+        game = await round_break(first)
+        assert (game.id, 'round') in first.timers.timers
+        revision = first.store.revisions[game.id]
+
+        # a tap during the round break
+        copy = await second.fetch(game.id)
+        assert not await second.apply(copy, lambda game: game.act(game.turn, ('take',)))
+        await settle()
+
+        assert first.get_game(game.id) is game
+        assert (game.id, 'round') in first.timers.timers
+        assert second.store.revisions[game.id] == revision
+
+    run(test)
+
+
+def test_saving_instance_takes_the_timers():
+    async def test(first: Manager, second: Manager):
+        game = await round_break(first)
+
+        copy = await second.fetch(game.id)
+        assert await second.apply(copy, lambda game: setattr(game, 'message', 2) or True)
+        await settle()
+
+        # nothing was emitted, the saving instance arms the timers itself
+        assert first.get_game(game.id) == None
+        assert (game.id, 'round') in second.timers.timers
+        assert (game.id, 'idle') in second.timers.timers
+
+    run(test)
+
+
+def test_accepted_once():
+    async def test(first: Manager, second: Manager):
+        game = await first.new_game([(1, 'a'), (2, 'b')], -1, 1)
+        copy = await second.fetch(game.id)
+
+        started = await asyncio.gather(first.ready_up(game), second.ready_up(copy))
+        assert sorted(started) == [False, True]
+
+        await settle()
+        game = await first.fetch(game.id)
+        assert game.round == 1
+
+    run(test)
+
+
+async def join_twice(mg: Manager) -> engine.Game:
+    '''
+    Lets player 2 of a started game invite someone and be invited,
+    both games end. Returns the first game.
+    '''
+    game = await mg.new_game([(1, 'a'), (2, 'b')], -1, 1)
+    await mg.ready_up(game)
+
+    await mg.new_game([(2, 'b'), (3, 'c')], -1, 2)
+    await mg.end_game(2)
+
+    other = await mg.new_game([(4, 'd'), (2, 'b')], -1, 3)
+    await mg.ready_up(other)
+    await mg.end_game(4)
+
+    return game
+
+
+def test_other_games_keep_the_first_one():
+    async def main():
+        mg = Manager()
+        game = await join_twice(mg)
+
+        assert mg.get_game_playing(2) is game
+
+    asyncio.run(main())
+
+
+def test_other_games_keep_the_first_one_shared():
+    async def test(first: Manager, second: Manager):
+        game = await join_twice(first)
+        await settle()
+
+        assert await first.store.find(2) == game.id
+        assert (await second.fetch_playing(2)).id == game.id
+
+    run(test)
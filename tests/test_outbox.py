@@ -0,0 +1,134 @@
+'''
+Outbox against the load test's fake Bot API.
+'''
+from typing import *
+
+import asyncio
+import time
+
+from aiogram import Bot, methods
+from aiogram.client.session.aiohttp import AiohttpSession
+from aiogram.client.telegram import TelegramAPIServer
+
+import loadtest
+from shulpek.outbox import Outbox
+
+
+PORT = 8091
+
+
+def run(test: Callable[[loadtest.FakeAPI, Bot], Awaitable]):
+    '''
+    Runs a test with a fresh fake API and a bot using it.
+    '''
+    async def main():
+        api = loadtest.FakeAPI()
+        api.sent = []
+        runner = await api.serve(PORT)
+
+        bot = Bot(loadtest.TOKEN, session=AiohttpSession(
+            api=TelegramAPIServer.from_base(f'http://127.0.0.1:{PORT}')
+        ))
+
+        try:
+            await test(api, bot)
+        finally:
+            await bot.session.close()
+            await runner.cleanup()
+
+    asyncio.run(main())
+
+
+def message(chat: int, text: str) -> Callable[[], methods.SendMessage]:
+    return lambda: methods.SendMessage(chat_id=chat, text=text)
+
+
+async def idle(outbox: Outbox):
+    while len(outbox.workers) > 0:
+        await asyncio.sleep(0.01)
+
+
+def test_merges_queued_updates():
+    async def test(api: loadtest.FakeAPI, bot: Bot):
+        outbox = Outbox(bot, chat_interval=0.2)
+
+        outbox.send(-1, message(-1, 'first'), key=1)
+        while len(api.sent) == 0:
+            await asyncio.sleep(0.01)
+
+        # queued while the chat waits for its slot
+        for i in range(5):
+            outbox.send(-1, message(-1, f'state {i}'), key=1)
+        outbox.send(-1, message(-1, 'other'), key=2)
+        await idle(outbox)
+
+        assert [i[1]['text'] for i in api.sent] == ['first', 'state 4', 'other']
+
+    run(test)
+
+
+def test_spaces_calls():
+    async def test(api: loadtest.FakeAPI, bot: Bot):
+        outbox = Outbox(bot, chat_interval=0.2, global_rate=20)
+
+        for i in range(3):
+            outbox.send(-1, message(-1, str(i)))
+            outbox.send(-2, message(-2, str(i)))
+        await idle(outbox)
+
+        for chat in ['-1', '-2']:
+            times = [i[0] for i in api.sent if i[1]['chat_id'] == chat]
+            assert len(times) == 3
+            assert all([b - a >= 0.19 for a, b in zip(times, times[1:])])
+
+        times = [i[0] for i in api.sent]
+        assert all([b - a >= 0.04 for a, b in zip(times, times[1:])])
+
+    run(test)
+
+
+def test_retries_after_flood_wait():
+    async def test(api: loadtest.FakeAPI, bot: Bot):
+        outbox = Outbox(bot, chat_interval=0.1, backoff=0.01)
+        api.flooded = 2
+
+        done = []
+        start = time.perf_counter()
+        outbox.send(-1, message(-1, 'x'), done.append)
+        await idle(outbox)
+
+        assert len(done) == 1 and done[0].text == 'x'
+        assert api.calls['sendmessage'] == 3
+        # two waits of `retry_after`
+        assert time.perf_counter() - start >= 2 * api.retry_after
+
+    run(test)
+
+
+def test_drops_after_retries():
+    async def test(api: loadtest.FakeAPI, bot: Bot):
+        outbox = Outbox(bot, chat_interval=0.1, retries=2)
+        api.flooded = 2
+        api.retry_after = 0
+
+        done = []
+        outbox.send(-1, message(-1, 'x'), done.append)
+        await idle(outbox)
+
+        assert done == [] and api.sent == []
+
+    run(test)
+
+
+def test_forgets_idle_chats():
+    async def test(api: loadtest.FakeAPI, bot: Bot):
+        outbox = Outbox(bot, chat_interval=0.1)
+
+        for chat in range(-10, 0):
+            outbox.send(chat, message(chat, 'x'))
+        await idle(outbox)
+
+        assert outbox.queues == {} and outbox.next_send == {}
+        assert len(api.sent) == 10
+
+    run(test)
@@ -0,0 +1,54 @@
+'''
+Session circuit breaker against the load test's fake Bot API.
+'''
+from typing import *
+
+import asyncio
+
+import pytest
+from aiogram import Bot
+from aiogram.client.telegram import TelegramAPIServer
+from aiogram.exceptions import TelegramServerError
+
+import loadtest
+from shulpek.session import CircuitBreaker, Session
+
+
+PORT = 8092
+
+
+def test_cancelled_probe_lets_another_through():
+    async def main():
+        api = loadtest.FakeAPI()
+        runner = await api.serve(PORT)
+
+        breaker = CircuitBreaker(failures=1, cooldown=0.0)
+        bot = Bot(loadtest.TOKEN, session=Session(
+            api=TelegramAPIServer.from_base(f'http://127.0.0.1:{PORT}'),
+            breaker=breaker
+        ))
+
+        try:
+            api.failing = True
+            with pytest.raises(TelegramServerError):
+                await bot.send_message(-1, 'x')
+            assert breaker.opened != None
+
+            # the probe is cancelled while the API is slow
+            api.failing = False
+            api.delay = 1.0
+            probe = asyncio.ensure_future(bot.send_message(-1, 'x'))
+            await asyncio.sleep(0.1)
+            assert breaker.probing
+            probe.cancel()
+            await asyncio.gather(probe, return_exceptions=True)
+
+            api.delay = 0.0
+            await bot.send_message(-1, 'x')
+            assert breaker.opened == None
+
+        finally:
+            await bot.session.close()
+            await runner.cleanup()
+
+    asyncio.run(main())
@@ -0,0 +1,85 @@
+'''
+Routing updates between shards.
+'''
+from typing import *
+
+from shulpek.shard import Router
+
+
+def message(chat: int, user: int, text: str) -> dict:
+    return {'message': {'chat': {'id': chat}, 'from': {'id': user}, 'text': text}}
+
+
+def inline(user: int) -> dict:
+    return {'inline_query': {'from': {'id': user}}}
+
+
+def accept(chat: int, author: int, invited: int) -> dict:
+    return {'callback_query': {
+        'from': {'id': invited},
+        'message': {'chat': {'id': chat}},
+        'data': f'accept:{author}:{invited}'
+    }}
+
+
+def test_invites_only_move_acknowledged_users():
+    router = Router(4)
+
+    # nobody answered yet, the invite may still be rejected
+    assert router.route(message(-2, 10, '/invite')) == 2
+    assert router.route(inline(10)) == router.shard_of(10)
+
+    router.acknowledge(2, False, [(10, True)])
+    assert router.route(inline(10)) == 2
+
+
+def test_refuses_joining_on_another_shard():
+    router = Router(4)
+    router.acknowledge(1, False, [(10, True), (11, True)])
+
+    assert router.route(message(-2, 10, '/invite')) == None
+    assert router.route(accept(-2, 12, 11)) == None
+
+    # the shard of the game answers that the user is already playing
+    assert router.route(message(-3, 10, '/invite')) == 1
+    assert router.route(message(-2, 10, '/leave')) == 1
+
+
+def test_leaving_keeps_newer_games():
+    router = Router(4)
+    router.acknowledge(1, False, [(10, True)])
+    router.acknowledge(2, False, [(10, True)])
+
+    router.acknowledge(1, False, [(10, False)])
+    assert router.users == {10: 2}
+
+    router.acknowledge(2, False, [(10, False)])
+    assert router.users == {}
+
+
+def test_restarted_worker_replaces_its_users():
+    router = Router(4)
+    router.acknowledge(1, False, [(10, True), (11, True)])
+    router.acknowledge(2, False, [(12, True)])
+
+    router.acknowledge(1, True, [(11, True)])
+    assert router.users == {11: 1, 12: 2}
+
+
+def test_map_survives_restart(tmp_path):
+    path = str(tmp_path / 'users.db')
+
+    router = Router(4, path)
+    router.acknowledge(1, False, [(10, True), (11, True)])
+    router.acknowledge(3, False, [(12, True)])
+    router.acknowledge(1, False, [(11, False)])
+    router.close()
+
+    router = Router(4, path)
+    assert router.users == {10: 1, 12: 3}
+    router.close()
+
+    # with fewer workers the removed shards' users are forgotten
+    router = Router(2, path)
+    assert router.users == {10: 1}
+    router.close()
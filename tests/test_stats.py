@@ -0,0 +1,82 @@
+'''
+Player stats written by several processes.
+'''
+from typing import *
+
+import asyncio
+
+from shulpek import engine, events
+from shulpek.stats import RedisStats, Stats
+from shulpek.store import FakeRedis, FakeServer
+
+
+def finish(stats: Stats, id: int, winner: int, loser: int):
+    '''
+    Feeds the stats a game `winner` won.
+    '''
+    game = engine.Game(lambda event: None, [(winner, 'a'), (loser, 'b')], -id, id, id)
+    game.ready = True
+    game.players[loser].pts = 105
+
+    stats.handle([events.GameOver(game, 'points')])
+
+
+async def settle(*stats: Stats):
+    for _ in range(50):
+        await asyncio.sleep(0.02)
+        if all([len(i.pending) == 0 and len(i.writes) == 0 for i in stats]):
+            await asyncio.sleep(0.05)
+            return
+
+
+def test_shared_database_converges(tmp_path):
+    path = str(tmp_path / 'stats.db')
+
+    async def main():
+        first = Stats(path, interval=0.01, shared=True)
+        second = Stats(path, interval=0.01, shared=True)
+        await first.start()
+        await second.start()
+
+        finish(first, 1, 10, 11)
+        finish(second, 2, 10, 12)
+        finish(second, 3, 12, 11)
+        await settle(first, second)
+
+        for i in [first, second]:
+            assert i.get(10)[1:3] == [2, 2]
+            assert i.get(11)[1:3] == [2, 0]
+            assert i.get(12)[1:3] == [2, 1]
+            assert [id for id, _ in i.top()] == [10, 12, 11]
+
+        await first.close()
+        await second.close()
+
+    asyncio.run(main())
+
+
+def test_redis_converges():
+    async def main():
+        server = FakeServer()
+        first = RedisStats(FakeRedis(server), interval=0.01)
+        await first.start()
+
+        finish(first, 1, 10, 11)
+        await settle(first)
+
+        # started later, loads what the first one wrote
+        second = RedisStats(FakeRedis(server), interval=0.01)
+        await second.start()
+        assert second.get(10) == first.get(10)
+
+        finish(second, 2, 10, 12)
+        await settle(first, second)
+
+        for i in [first, second]:
+            assert i.get(10)[1:3] == [2, 2]
+            assert i.get(12)[1:3] == [1, 0]
+
+        await first.close()
+        await second.close()
+
+    asyncio.run(main())
@@ -0,0 +1,107 @@
+'''
+Game snapshots surviving a killed process.
+'''
+from typing import *
+
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+from shulpek import engine
+from shulpek.storage import Storage
+
+
+# plays games saving them like the bot does, reports what it saved and waits to be killed
+PLAYER = '''
+import asyncio, json, random, sys
+from shulpek import engine, events, sim
+from shulpek.storage import Storage
+
+async def main():
+    storage = Storage(sys.argv[1])
+
+    def persist(event):
+        if isinstance(event, events.GameOver):
+            storage.delete(event.game.id)
+        else:
+            storage.save(event.game)
+
+    rng = random.Random(0)
+    games = [engine.Game(persist, [(i * 2 + 1, 'a'), (i * 2 + 2, 'b')], -i, i, i) for i in range(20)]
+    for game in games:
+        game.ready_up()
+
+    for step in range(int(sys.argv[2])):
+        for game in games:
+            if game.over: continue
+
+            if game.waiting:
+                game.new_round()
+            else:
+                sim.apply(game, game.turn, sim.random_policy(game, game.turn, rng))
+        await asyncio.sleep(0)
+
+    games[0].end('left')
+    await asyncio.sleep(0)
+    while len(storage.writes) > 0:
+        await asyncio.gather(*storage.writes)
+
+    print(json.dumps({game.id: game.to_dict() for game in games if not game.over}), flush=True)
+    await asyncio.sleep(3600)
+
+asyncio.run(main())
+'''
+
+
+def kill_and_restore(path: str, steps: int) -> Tuple[dict, List[dict]]:
+    '''
+    Returns the games the killed process had and the ones restored.
+    '''
+    process = subprocess.Popen(
+        [sys.executable, '-c', PLAYER, path, str(steps)],
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+        stdout=subprocess.PIPE, text=True
+    )
+
+    try:
+        expected = json.loads(process.stdout.readline())
+    finally:
+        process.kill()
+        process.wait()
+        process.stdout.close()
+
+    storage = Storage(path)
+    try:
+        return expected, storage.load()
+    finally:
+        asyncio.run(storage.close())
+
+
+def test_restores_killed_games(tmp_path):
+    expected, restored = kill_and_restore(str(tmp_path / 'shulpek.db'), 30)
+
+    assert len(expected) > 0
+    assert {str(i['id']): i for i in restored} == expected
+
+
+def test_restored_games_continue(tmp_path):
+    _, restored = kill_and_restore(str(tmp_path / 'shulpek.db'), 60)
+
+    for data in restored:
+        game = engine.Game.from_dict(lambda event: None, data)
+        assert game.to_dict() == data
+        assert not game.over
+
+        # a round break left by the kill is finished by the round timer
+        if game.waiting:
+            assert game.new_round()
+        assert game.can_act(game.turn)
+
+
+def test_finished_games_are_not_restored(tmp_path):
+    expected, restored = kill_and_restore(str(tmp_path / 'shulpek.db'), 10)
+
+    assert '1' not in expected
+    assert 1 not in [i['id'] for i in restored]